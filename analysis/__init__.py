@@ -5,4 +5,5 @@ Modules:
     branch_analysis   BCG quadrant, seasonality, category mix, service type KPIs
     margin_leaks      Five independent profit-leak detectors (the "62M Report")
     menu_engineering   Menu matrix classification and modifier attachment analysis
+    preprocessing     Shared, per-frame cached filtered views of the product/monthly data
 """
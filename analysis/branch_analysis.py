@@ -9,76 +9,70 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
 from plotly.subplots import make_subplots
 
+from analysis.preprocessing import get_branch_category_totals, get_product_rows
+
 
 def branch_performance_quadrant(monthly_df, category_df):
     """
     Create BCG-style 2x2 scatter: Revenue vs Growth, sized by volume, colored by margin.
     """
     # Get 2025 annual revenue per branch
-    df_2025 = monthly_df[monthly_df['Year'] == 2025].copy()
-    df_2026 = monthly_df[monthly_df['Year'] == 2026].copy()
+    df_2025 = monthly_df[monthly_df['Year'] == 2025]
+    df_2026 = monthly_df[monthly_df['Year'] == 2026]
+
+    perf_df = df_2025[['Branch', 'Total_By_Year', 'Region', 'January']].drop_duplicates('Branch')
 
     # YoY Growth: compare Jan 2026 vs Jan 2025
-    jan_2025 = df_2025.set_index('Branch')['January'].to_dict()
-    jan_2026 = df_2026.set_index('Branch')['January'].to_dict()
-
-    rows = []
-    for branch in df_2025['Branch'].unique():
-        rev_2025 = df_2025[df_2025['Branch'] == branch]['Total_By_Year'].values[0]
-        j25 = jan_2025.get(branch, 0)
-        j26 = jan_2026.get(branch, 0)
-
-        # Growth rate
-        if j25 > 0:
-            growth = (j26 - j25) / j25 * 100
-        elif j26 > 0:
-            growth = 100  # New branch, infinite growth capped
-        else:
-            growth = 0
-
-        # Get margin from category summary
-        branch_cat = category_df[(category_df['Branch'] == branch) & (~category_df['IsAggregate'])]
-        if len(branch_cat) > 0:
-            total_profit = branch_cat['TotalProfit'].sum()
-            total_revenue = branch_cat['TrueRevenue'].sum()
-            margin = total_profit / total_revenue * 100 if total_revenue > 0 else 0
-            qty = branch_cat['Qty'].sum()
-        else:
-            margin = 0
-            qty = 0
-
-        region = df_2025[df_2025['Branch'] == branch]['Region'].values[0]
-
-        rows.append({
-            'Branch': branch.replace('Stories ', ''),
-            'Branch_Full': branch,
-            'Revenue_2025': rev_2025,
-            'Jan_Growth_Pct': growth,
-            'Avg_Margin_Pct': margin,
-            'Total_Qty': qty,
-            'Region': region,
-        })
-
-    perf_df = pd.DataFrame(rows)
+    jan_2026 = df_2026.drop_duplicates('Branch', keep='last').set_index('Branch')['January'].rename('Jan_2026')
+
+    # Margin and volume from category summary, one groupby for all branches
+    cat_totals = get_branch_category_totals(category_df)
+    branch_cat = pd.DataFrame({
+        'Total_Profit': cat_totals['TotalProfit'].sum(axis=1),
+        'Total_Revenue': cat_totals['TrueRevenue'].sum(axis=1),
+        'Total_Qty': cat_totals['Qty'].sum(axis=1),
+    })
+
+    perf_df = (
+        perf_df
+        .merge(jan_2026, how='left', left_on='Branch', right_index=True)
+        .merge(branch_cat, how='left', left_on='Branch', right_index=True)
+        .reset_index(drop=True)
+    )
+
+    j25 = perf_df['January'].to_numpy(dtype=float)
+    j26 = perf_df['Jan_2026'].fillna(0).to_numpy(dtype=float)
+    total_profit = perf_df['Total_Profit'].fillna(0).to_numpy(dtype=float)
+    total_revenue = perf_df['Total_Revenue'].fillna(0).to_numpy(dtype=float)
+
+    # Growth rate (new branches with no Jan 2025 sales are capped at 100%)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        growth = np.where(j25 > 0, (j26 - j25) / j25 * 100, np.where(j26 > 0, 100, 0))
+        margin = np.where(total_revenue > 0, total_profit / total_revenue * 100, 0)
+
+    perf_df = pd.DataFrame({
+        'Branch': perf_df['Branch'].str.replace('Stories ', ''),
+        'Branch_Full': perf_df['Branch'],
+        'Revenue_2025': perf_df['Total_By_Year'],
+        'Jan_Growth_Pct': growth,
+        'Avg_Margin_Pct': margin,
+        'Total_Qty': perf_df['Total_Qty'].fillna(0),
+        'Region': perf_df['Region'],
+    })
 
     # Compute medians for quadrant lines
     med_rev = perf_df['Revenue_2025'].median()
     med_growth = perf_df['Jan_Growth_Pct'].median()
 
-    # Assign quadrant labels
-    def assign_quadrant(row):
-        if row['Revenue_2025'] >= med_rev and row['Jan_Growth_Pct'] >= med_growth:
-            return '⭐ Star'
-        elif row['Revenue_2025'] >= med_rev and row['Jan_Growth_Pct'] < med_growth:
-            return '🐄 Cash Cow'
-        elif row['Revenue_2025'] < med_rev and row['Jan_Growth_Pct'] >= med_growth:
-            return '❓ Question Mark'
-        else:
-            return '🐕 Dog'
-
-    perf_df['Quadrant'] = perf_df.apply(assign_quadrant, axis=1)
+    # Assign quadrant labels: 2-bit index (low revenue, low growth) into the label array
+    labels = ['⭐ Star', '🐄 Cash Cow', '❓ Question Mark', '🐕 Dog']
+    high_rev = perf_df['Revenue_2025'].to_numpy() >= med_rev
+    high_growth = perf_df['Jan_Growth_Pct'].to_numpy() >= med_growth
+    codes = (~high_rev).astype(np.int8) * 2 + (~high_growth).astype(np.int8)
+    perf_df['Quadrant'] = pd.Categorical.from_codes(codes, categories=labels)
 
     fig = px.scatter(
         perf_df,
@@ -87,13 +81,7 @@ def branch_performance_quadrant(monthly_df, category_df):
         size='Total_Qty',
         color='Quadrant',
         hover_name='Branch',
-        hover_data={
-            'Revenue_2025': ':,.0f',
-            'Jan_Growth_Pct': ':.1f',
-            'Avg_Margin_Pct': ':.1f',
-            'Region': True,
-            'Total_Qty': ':,.0f',
-        },
+        custom_data=['Avg_Margin_Pct', 'Region', 'Total_Qty'],
         color_discrete_map={
             '⭐ Star': '#2ecc71',
             '🐄 Cash Cow': '#3498db',
@@ -105,17 +93,20 @@ def branch_performance_quadrant(monthly_df, category_df):
             'Revenue_2025': '2025 Total Revenue',
             'Jan_Growth_Pct': 'YoY Growth (Jan 2026 vs Jan 2025) %',
         },
+        height=600,
+        template='plotly_white',
     )
 
     # Add quadrant lines
     fig.add_hline(y=med_growth, line_dash='dash', line_color='gray', opacity=0.5)
     fig.add_vline(x=med_rev, line_dash='dash', line_color='gray', opacity=0.5)
 
-    fig.update_layout(
-        height=600,
-        template='plotly_white',
-        font=dict(family='Inter, sans-serif'),
-    )
+    fig.update_traces(hovertemplate=(
+        '<b>%{hovertext}</b><br>Revenue: %{x:,.0f}<br>Growth: %{y:.1f}%'
+        '<br>Margin: %{customdata[0]:.1f}%<br>Region: %{customdata[1]}'
+        '<br>Qty: %{customdata[2]:,.0f}<extra>%{fullData.name}</extra>'
+    ))
+    fig.update_layout(font=dict(family='Inter, sans-serif'))
 
     return fig, perf_df
 
@@ -125,54 +116,59 @@ def seasonality_analysis(monthly_df):
     Analyze monthly seasonality patterns across the chain.
     Returns two figures: chain-level trend + branch heatmap.
     """
-    df_2025 = monthly_df[monthly_df['Year'] == 2025].copy()
+    df_2025 = monthly_df[monthly_df['Year'] == 2025]
     months = ['January', 'February', 'March', 'April', 'May', 'June',
               'July', 'August', 'September', 'October', 'November', 'December']
 
     # Chain-level monthly totals
     chain_monthly = df_2025[months].sum()
 
-    # Line chart
-    fig_trend = go.Figure()
-    fig_trend.add_trace(go.Scatter(
-        x=months,
-        y=chain_monthly.values,
-        mode='lines+markers',
-        name='2025 Monthly Revenue',
-        line=dict(color='#8B4513', width=3),
-        marker=dict(size=10),
-        hovertemplate='%{x}: %{y:,.0f}<extra></extra>',
-    ))
-
-    # Add annotations for key months
+    # Key months for annotations
     peak_month = chain_monthly.idxmax()
     trough_month = chain_monthly.idxmin()
 
-    fig_trend.add_annotation(
-        x=peak_month, y=chain_monthly[peak_month],
-        text=f"Peak: {peak_month}<br>{chain_monthly[peak_month]:,.0f}",
-        showarrow=True, arrowhead=2, ax=0, ay=-40,
-        font=dict(color='green', size=12),
-    )
-    fig_trend.add_annotation(
-        x=trough_month, y=chain_monthly[trough_month],
-        text=f"Trough: {trough_month}<br>{chain_monthly[trough_month]:,.0f}",
-        showarrow=True, arrowhead=2, ax=0, ay=40,
-        font=dict(color='red', size=12),
-    )
-
-    fig_trend.update_layout(
-        title='Chain-Wide Monthly Revenue — 2025 Seasonality',
-        xaxis_title='Month',
-        yaxis_title='Total Revenue',
-        height=450,
-        template='plotly_white',
-    )
+    # Line chart, assembled as a plain dict spec: skips graph_objects validation
+    fig_trend = go.Figure({
+        'data': [{
+            'type': 'scatter',
+            'x': months,
+            'y': chain_monthly.to_numpy(dtype=np.float64),
+            'mode': 'lines+markers',
+            'name': '2025 Monthly Revenue',
+            'line': {'color': '#8B4513', 'width': 3},
+            'marker': {'size': 10},
+            'hovertemplate': '%{x}: %{y:,.0f}<extra></extra>',
+        }],
+        'layout': {
+            'title': {'text': 'Chain-Wide Monthly Revenue — 2025 Seasonality'},
+            'xaxis': {'title': {'text': 'Month'}},
+            'yaxis': {'title': {'text': 'Total Revenue'}},
+            'height': 450,
+            'template': pio.templates['plotly_white'],
+            'annotations': [
+                {
+                    'x': peak_month, 'y': chain_monthly[peak_month],
+                    'text': f"Peak: {peak_month}<br>{chain_monthly[peak_month]:,.0f}",
+                    'showarrow': True, 'arrowhead': 2, 'ax': 0, 'ay': -40,
+                    'font': {'color': 'green', 'size': 12},
+                },
+                {
+                    'x': trough_month, 'y': chain_monthly[trough_month],
+                    'text': f"Trough: {trough_month}<br>{chain_monthly[trough_month]:,.0f}",
+                    'showarrow': True, 'arrowhead': 2, 'ax': 0, 'ay': 40,
+                    'font': {'color': 'red', 'size': 12},
+                },
+            ],
+        },
+    }, _validate=False)
 
     # Branch × Month heatmap
     heatmap_data = df_2025.set_index('Branch')[months]
-    # Normalize each branch by its own max (to show relative seasonality)
-    heatmap_norm = heatmap_data.div(heatmap_data.max(axis=1), axis=0)
+    # Normalize each branch by its own max (to show relative seasonality).
+    # float32 is plenty for a colour scale and halves the bytes moved.
+    heatmap_norm = heatmap_data.to_numpy(dtype=np.float32, copy=True)
+    peak = heatmap_norm.max(axis=1, keepdims=True)
+    np.divide(heatmap_norm, np.where(peak > 0, peak, 1), out=heatmap_norm)
 
     fig_heatmap = px.imshow(
         heatmap_norm,
@@ -182,8 +178,9 @@ def seasonality_analysis(monthly_df):
         color_continuous_scale='YlOrBr',
         title='Branch Seasonality Heatmap (Relative to Each Branch\'s Peak)',
         aspect='auto',
+        height=700,
+        template='plotly_white',
     )
-    fig_heatmap.update_layout(height=700, template='plotly_white')
 
     return fig_trend, fig_heatmap, chain_monthly
 
@@ -192,33 +189,18 @@ def category_mix_analysis(category_df):
     """
     Beverages vs Food performance analysis per branch.
     """
-    df = category_df[~category_df['IsAggregate']].copy()
-
-    # Pivot: Branch × Category
-    pivot = df.pivot_table(
-        index='Branch',
-        columns='Category',
-        values=['TrueRevenue', 'TotalProfit', 'Qty', 'ProfitMargin'],
-        aggfunc='sum',
-    ).reset_index()
+    df = category_df[~category_df['IsAggregate']]
 
-    # Flatten columns
-    pivot.columns = ['_'.join(col).strip('_') if isinstance(col, tuple) else col
-                     for col in pivot.columns]
+    # Pivot: Branch × Category (shared, cached groupby + unstack)
+    pivot = get_branch_category_totals(category_df)
 
     # Beverage share %
-    bev_rev = df[df['Category'] == 'BEVERAGES'].groupby('Branch')['TrueRevenue'].sum()
-    food_rev = df[df['Category'] == 'FOOD'].groupby('Branch')['TrueRevenue'].sum()
-    total_rev = bev_rev.add(food_rev, fill_value=0)
-    bev_share = (bev_rev / total_rev * 100).reset_index()
-    bev_share.columns = ['Branch', 'BeverageSharePct']
+    rev = pivot['TrueRevenue'].reindex(columns=['BEVERAGES', 'FOOD'], fill_value=0)
+    bev_share = (rev['BEVERAGES'] / (rev['BEVERAGES'] + rev['FOOD']) * 100).reset_index(name='BeverageSharePct')
 
     # Stacked bar chart
-    chart_data = df.copy()
-    chart_data['Branch_Short'] = chart_data['Branch'].str.replace('Stories ', '')
-
     fig = px.bar(
-        chart_data,
+        df,
         x='Branch_Short',
         y='TrueRevenue',
         color='Category',
@@ -226,15 +208,17 @@ def category_mix_analysis(category_df):
         title='Revenue Breakdown: Beverages vs Food by Branch',
         labels={'TrueRevenue': 'Revenue', 'Branch_Short': 'Branch'},
         color_discrete_map={'BEVERAGES': '#8B4513', 'FOOD': '#DEB887'},
-        hover_data={'ProfitMargin': ':.1f'},
-    )
-
-    fig.update_layout(
+        custom_data=['ProfitMargin'],
         height=500,
         template='plotly_white',
-        xaxis_tickangle=-45,
     )
 
+    fig.update_traces(hovertemplate=(
+        '<b>%{x}</b><br>Revenue: %{y:,.0f}<br>Margin: %{customdata[0]:.1f}%'
+        '<extra>%{fullData.name}</extra>'
+    ))
+    fig.update_layout(xaxis_tickangle=-45)
+
     return fig, bev_share
 
 
@@ -243,10 +227,10 @@ def service_type_analysis(product_df):
     Analyze revenue split by service type (TAKE AWAY vs TABLE vs Toters).
     """
     # Filter to non-aggregate product rows
-    df = product_df[~product_df['IsAggregate']].copy()
+    df = get_product_rows(product_df)
 
     # Group by branch + service type
-    service_rev = df.groupby(['Branch', 'ServiceType']).agg(
+    service_rev = df.groupby(['Branch', 'ServiceType'], observed=True).agg(
         Revenue=('TrueRevenue', 'sum'),
         Profit=('TotalProfit', 'sum'),
         Qty=('Qty', 'sum'),
@@ -267,22 +251,30 @@ def service_type_analysis(product_df):
             'TABLE': '#2ecc71',
             'Toters': '#e74c3c',
         },
-    )
-
-    fig.update_layout(
+        custom_data=['Profit', 'Qty'],
         height=500,
         template='plotly_white',
-        xaxis_tickangle=-45,
     )
 
+    fig.update_traces(hovertemplate=(
+        '<b>%{x}</b><br>Revenue: %{y:,.0f}<br>Profit: %{customdata[0]:,.0f}'
+        '<br>Qty: %{customdata[1]:,.0f}<extra>%{fullData.name}</extra>'
+    ))
+    fig.update_layout(xaxis_tickangle=-45)
+
     return fig, service_rev
 
 
-def top_bottom_branches(monthly_df, n=5):
-    """Get top and bottom N branches by 2025 revenue."""
-    df_2025 = monthly_df[monthly_df['Year'] == 2025].sort_values('Total_By_Year', ascending=False)
-    top = df_2025.head(n)[['Branch', 'Total_By_Year', 'Region']].copy()
-    bottom = df_2025.tail(n)[['Branch', 'Total_By_Year', 'Region']].copy()
+def rank_branches(monthly_df):
+    """2025 branch rows sorted by annual revenue, highest first."""
+    return monthly_df[monthly_df['Year'] == 2025].sort_values('Total_By_Year', ascending=False)
+
+
+def top_bottom_branches(monthly_df, n=5, ranked=None):
+    """Get top and bottom N branches by 2025 revenue (pass `ranked` from rank_branches to reuse it)."""
+    df_2025 = rank_branches(monthly_df) if ranked is None else ranked
+    top = df_2025.head(n)[['Branch', 'Total_By_Year', 'Region']]
+    bottom = df_2025.tail(n)[['Branch', 'Total_By_Year', 'Region']]
     return top, bottom
 
 
@@ -291,20 +283,16 @@ def chain_kpis(monthly_df, category_df, product_df):
     df_2025 = monthly_df[monthly_df['Year'] == 2025]
     cat_data = category_df[~category_df['IsAggregate']]
 
-    total_revenue = cat_data['TrueRevenue'].sum()
-    total_profit = cat_data['TotalProfit'].sum()
-    total_cost = cat_data['TotalCost'].sum()
+    # One reduction pass over the four float columns instead of four .sum() calls
+    total_revenue, total_profit, total_cost, total_qty = np.nansum(
+        cat_data[['TrueRevenue', 'TotalProfit', 'TotalCost', 'Qty']].to_numpy(dtype=np.float64), axis=0
+    )
     avg_margin = total_profit / total_revenue * 100 if total_revenue > 0 else 0
     n_branches = df_2025['Branch'].nunique()
 
     # Count unique products
-    products = product_df[
-        (~product_df['IsAggregate']) &
-        (~product_df['Product'].str.startswith('Total'))
-    ]
-    n_products = products['Product'].nunique()
-
-    total_qty = cat_data['Qty'].sum()
+    rows = get_product_rows(product_df)
+    n_products = rows.loc[~rows['IsTotal'], 'Product'].nunique()
 
     return {
         'total_revenue': total_revenue,
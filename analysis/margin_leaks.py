@@ -9,6 +9,17 @@ import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
+import plotly.io as pio
+
+from analysis.preprocessing import cache_per_frame, get_active_products, get_product_rows
+
+
+@cache_per_frame
+def _zero_price_costing(product_df):
+    """Active rows rung up at zero price that still carry a cost (cached, read-only)."""
+    active = get_active_products(product_df)
+    mask = (active['TotalPrice'].to_numpy() == 0) & (active['TotalCost'].to_numpy() > 0)
+    return active.loc[mask]
 
 
 def find_negative_margin_products(product_df):
@@ -19,14 +30,10 @@ def find_negative_margin_products(product_df):
     TotalProfit < 0.  Each row represents a branch-service-product combo
     that is being sold below its cost of goods.
     """
-    df = product_df[
-        (~product_df['IsAggregate']) &
-        (product_df['Qty'] > 0) &
-        (product_df['TotalProfit'] < 0)
-    ].copy()
+    active = get_active_products(product_df)
+    df = active[active['TotalProfit'] < 0]
 
     df['Loss_Amount'] = df['TotalProfit'].abs()
-    df['Branch_Short'] = df['Branch'].str.replace('Stories ', '')
 
     df = df.sort_values('Loss_Amount', ascending=False)
 
@@ -41,15 +48,8 @@ def find_zero_revenue_modifiers(product_df):
     These are hidden margin destroyers: oat milk, decaf shots, etc.
     that the POS rings up at zero price while COGS are still incurred.
     """
-    df = product_df[
-        (~product_df['IsAggregate']) &
-        (product_df['TotalPrice'] == 0) &
-        (product_df['TotalCost'] > 0) &
-        (product_df['Qty'] > 0)
-    ].copy()
-
-    df['Absorbed_Cost'] = df['TotalCost']
-    df = df.sort_values('Absorbed_Cost', ascending=False)
+    df = _zero_price_costing(product_df)
+    df = df.assign(Absorbed_Cost=df['TotalCost']).sort_values('Absorbed_Cost', ascending=False)
 
     return df[['Branch', 'ServiceType', 'Product', 'Qty', 'TotalCost',
                'Absorbed_Cost']]
@@ -60,14 +60,14 @@ def find_underpriced_products(product_df, margin_threshold=10):
     Find products with abnormally low margins (below threshold %)
     that are being sold in significant volume.
     """
-    df = product_df[
-        (~product_df['IsAggregate']) &
-        (product_df['Qty'] >= 10) &  # Meaningful volume
-        (product_df['ProfitPct'] < margin_threshold) &
-        (product_df['ProfitPct'] > -500) &  # Not data errors
-        (product_df['TrueRevenue'] > 0) &
-        (~product_df['Product'].str.startswith('Total'))
-    ].copy()
+    active = get_active_products(product_df)
+    df = active[
+        (active['Qty'] >= 10) &  # Meaningful volume
+        (active['ProfitPct'] < margin_threshold) &
+        (active['ProfitPct'] > -500) &  # Not data errors
+        (active['TrueRevenue'] > 0) &
+        (~active['IsTotal'])
+    ]
 
     df = df.sort_values('TotalProfit', ascending=True)
     return df
@@ -77,27 +77,19 @@ def veggie_sub_analysis(product_df):
     """
     Deep dive into the Veggie Sub pricing disaster.
     """
-    veggie = product_df[
-        product_df['Product'].str.contains('VEGGIE', case=False, na=False) &
-        (~product_df['IsAggregate'])
-    ].copy()
+    rows = get_product_rows(product_df)
+    veggie = rows[rows['IsVeggie']]
 
     if len(veggie) == 0:
         return None, {}
 
-    total_qty = veggie['Qty'].sum()
-    total_revenue = veggie['TrueRevenue'].sum()
-    total_cost = veggie['TotalCost'].sum()
-    total_loss = veggie['TotalProfit'].sum()
+    total_qty, total_revenue, total_cost, total_loss = np.nansum(
+        veggie[['Qty', 'TrueRevenue', 'TotalCost', 'TotalProfit']].to_numpy(dtype=np.float64), axis=0
+    )
 
     # What it should be priced at (benchmark against other subs)
-    subs = product_df[
-        product_df['Product'].str.contains('SUB|SANDWICH', case=False, na=False) &
-        (~product_df['IsAggregate']) &
-        (~product_df['Product'].str.contains('VEGGIE', case=False, na=False)) &
-        (product_df['Qty'] > 0) &
-        (product_df['ProfitPct'] > 30)
-    ]
+    active = get_active_products(product_df)
+    subs = active[active['IsSub'] & (~active['IsVeggie']) & (active['ProfitPct'] > 30)]
     if len(subs) > 0:
         avg_sub_price = subs['UnitRevenue'].mean()
     else:
@@ -124,15 +116,10 @@ def free_modifiers_cost(product_df):
     """
     Quantify the total cost absorbed by free modifiers.
     """
-    free_mods = product_df[
-        (~product_df['IsAggregate']) &
-        (product_df['TotalPrice'] == 0) &
-        (product_df['TotalCost'] > 0) &
-        (product_df['Qty'] > 0)
-    ].copy()
+    free_mods = _zero_price_costing(product_df)
 
     # Group by product type
-    summary = free_mods.groupby('Product').agg(
+    summary = free_mods.groupby('Product', observed=True).agg(
         Total_Qty=('Qty', 'sum'),
         Total_Cost=('TotalCost', 'sum'),
         Branches=('Branch', 'nunique'),
@@ -147,32 +134,31 @@ def cheesecake_margin_analysis(product_df):
     """
     Analyze the cheesecake margin problem — all varieties significantly below food avg.
     """
-    cheese = product_df[
-        product_df['Product'].str.contains('CHEESE CAKE|CHEESECAKE', case=False, na=False) &
-        (~product_df['IsAggregate']) &
-        (product_df['Qty'] > 0)
-    ].copy()
+    active = get_active_products(product_df)
+    cheese = active[active['IsCheesecake']]
 
     if len(cheese) == 0:
         return None, {}
 
     # Food average margin
-    food = product_df[
-        (product_df['Category'] == 'FOOD') &
-        (~product_df['IsAggregate']) &
-        (product_df['Qty'] > 0)
-    ]
-    food_avg_margin = food['TotalProfit'].sum() / food['TrueRevenue'].sum() * 100 if food['TrueRevenue'].sum() > 0 else 63
+    food = active[active['Category'] == 'FOOD']
+    food_profit, food_revenue = np.nansum(
+        food[['TotalProfit', 'TrueRevenue']].to_numpy(dtype=np.float64), axis=0
+    )
+    food_avg_margin = food_profit / food_revenue * 100 if food_revenue > 0 else 63
 
-    cheese_margin = cheese['TotalProfit'].sum() / cheese['TrueRevenue'].sum() * 100 if cheese['TrueRevenue'].sum() > 0 else 0
+    cheese_profit, cheese_revenue, cheese_qty = np.nansum(
+        cheese[['TotalProfit', 'TrueRevenue', 'Qty']].to_numpy(dtype=np.float64), axis=0
+    )
+    cheese_margin = cheese_profit / cheese_revenue * 100 if cheese_revenue > 0 else 0
     margin_gap = food_avg_margin - cheese_margin
 
     # If cheesecakes had food avg margin, how much more profit?
-    additional_profit = cheese['TrueRevenue'].sum() * margin_gap / 100
+    additional_profit = cheese_revenue * margin_gap / 100
 
     stats = {
-        'total_qty': cheese['Qty'].sum(),
-        'total_revenue': cheese['TrueRevenue'].sum(),
+        'total_qty': cheese_qty,
+        'total_revenue': cheese_revenue,
         'cheese_margin': cheese_margin,
         'food_avg_margin': food_avg_margin,
         'margin_gap': margin_gap,
@@ -186,22 +172,13 @@ def amioun_pricing_analysis(product_df):
     """
     Analyze the Stories Amioun TABLE pricing catastrophe.
     """
-    amioun = product_df[
-        (product_df['Branch'].str.contains('Amioun', case=False, na=False)) &
-        (product_df['ServiceType'] == 'TABLE') &
-        (~product_df['IsAggregate']) &
-        (product_df['ProfitPct'] < 0) &
-        (product_df['Qty'] > 0)
-    ].copy()
+    active = get_active_products(product_df)
+    losing = active[active['IsAmioun'] & (active['ProfitPct'] < 0)]
+    amioun = losing[losing['ServiceType'] == 'TABLE']
 
     if len(amioun) == 0:
         # Try all service types
-        amioun = product_df[
-            (product_df['Branch'].str.contains('Amioun', case=False, na=False)) &
-            (~product_df['IsAggregate']) &
-            (product_df['ProfitPct'] < 0) &
-            (product_df['Qty'] > 0)
-        ].copy()
+        amioun = losing
 
     total_loss = amioun['TotalProfit'].sum() if len(amioun) > 0 else 0
 
@@ -279,27 +256,33 @@ def margin_leak_waterfall(leak_df):
     Create a waterfall chart showing cumulative margin leaks.
     """
     leak_df_sorted = leak_df.sort_values('Annual_Loss', ascending=False)
-
-    fig = go.Figure(go.Waterfall(
-        name='Margin Leaks',
-        orientation='v',
-        x=leak_df_sorted['Leak'].tolist() + ['Total Recoverable'],
-        y=list(-leak_df_sorted['Annual_Loss']) + [leak_df_sorted['Annual_Loss'].sum()],
-        measure=['relative'] * len(leak_df_sorted) + ['total'],
-        connector=dict(line=dict(color='#666')),
-        decreasing=dict(marker=dict(color='#e74c3c')),
-        increasing=dict(marker=dict(color='#2ecc71')),
-        totals=dict(marker=dict(color='#3498db')),
-        text=[f'-{v:,.0f}' for v in leak_df_sorted['Annual_Loss']] + [f'+{leak_df_sorted["Annual_Loss"].sum():,.0f}'],
-        textposition='outside',
-    ))
-
-    fig.update_layout(
-        title='Profit Leak Waterfall — Annual Impact',
-        yaxis_title='Profit Impact',
-        height=500,
-        template='plotly_white',
-        showlegend=False,
-    )
+    # Numeric arrays stay as float64 ndarrays so plotly ships them as base64 typed arrays
+    losses = leak_df_sorted['Annual_Loss'].to_numpy(dtype=np.float64)
+    total = losses.sum()
+
+    # Plain dict spec: skips graph_objects validation on construction
+    fig = go.Figure({
+        'data': [{
+            'type': 'waterfall',
+            'name': 'Margin Leaks',
+            'orientation': 'v',
+            'x': leak_df_sorted['Leak'].tolist() + ['Total Recoverable'],
+            'y': np.append(-losses, total),
+            'measure': ['relative'] * len(losses) + ['total'],
+            'connector': {'line': {'color': '#666'}},
+            'decreasing': {'marker': {'color': '#e74c3c'}},
+            'increasing': {'marker': {'color': '#2ecc71'}},
+            'totals': {'marker': {'color': '#3498db'}},
+            'text': [f'-{v:,.0f}' for v in losses] + [f'+{total:,.0f}'],
+            'textposition': 'outside',
+        }],
+        'layout': {
+            'title': {'text': 'Profit Leak Waterfall — Annual Impact'},
+            'yaxis': {'title': {'text': 'Profit Impact'}},
+            'height': 500,
+            'template': pio.templates['plotly_white'],
+            'showlegend': False,
+        },
+    }, _validate=False)
 
     return fig
@@ -10,6 +10,11 @@ import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
 
+from analysis.preprocessing import cache_per_frame, get_active_products
+
+# Product-name prefixes the POS uses for drink add-ons
+MODIFIER_PREFIXES = ('ADD ', 'REPLACE ')
+
 
 def build_menu_matrix(product_df, min_qty=5):
     """
@@ -21,17 +26,16 @@ def build_menu_matrix(product_df, min_qty=5):
     Dogs: Low volume + Low margin (consider removing)
     """
     # Filter to individual products only
-    df = product_df[
-        (~product_df['IsAggregate']) &
-        (product_df['Qty'] >= min_qty) &
-        (~product_df['Product'].str.startswith('Total')) &
-        (~product_df['Product'].str.startswith('ADD ')) &  # Exclude modifiers
-        (~product_df['Product'].str.startswith('REPLACE ')) &
-        (product_df['TrueRevenue'] > 0)
-    ].copy()
+    active = get_active_products(product_df)
+    df = active[
+        (active['Qty'] >= min_qty) &
+        (~active['IsTotal']) &
+        (~active['Product'].str.startswith(MODIFIER_PREFIXES).astype(bool)) &  # Exclude modifiers
+        (active['TrueRevenue'] > 0)
+    ]
 
     # Aggregate across all branches for chain-level view
-    chain = df.groupby('Product').agg(
+    chain = df.groupby('Product', observed=True).agg(
         Total_Qty=('Qty', 'sum'),
         Total_Revenue=('TrueRevenue', 'sum'),
         Total_Cost=('TotalCost', 'sum'),
@@ -63,19 +67,12 @@ def build_menu_matrix(product_df, min_qty=5):
     med_qty = chain['Total_Qty'].median()
     med_margin = chain['Margin_Pct'].median()
 
-    def classify(row):
-        high_vol = row['Total_Qty'] >= med_qty
-        high_margin = row['Margin_Pct'] >= med_margin
-        if high_vol and high_margin:
-            return '⭐ Star'
-        elif high_vol and not high_margin:
-            return '🐴 Plowhorse'
-        elif not high_vol and high_margin:
-            return '🧩 Puzzle'
-        else:
-            return '🐕 Dog'
-
-    chain['Quadrant'] = chain.apply(classify, axis=1)
+    # 2-bit index (low volume, low margin) into the quadrant label array
+    labels = ['⭐ Star', '🐴 Plowhorse', '🧩 Puzzle', '🐕 Dog']
+    high_vol = chain['Total_Qty'].to_numpy() >= med_qty
+    high_margin = chain['Margin_Pct'].to_numpy() >= med_margin
+    codes = (~high_vol).astype(np.int8) * 2 + (~high_margin).astype(np.int8)
+    chain['Quadrant'] = pd.Categorical.from_codes(codes, categories=labels)
 
     return chain, med_qty, med_margin
 
@@ -91,14 +88,7 @@ def menu_matrix_chart(chain_df, med_qty, med_margin):
         size='Total_Revenue',
         color='Quadrant',
         hover_name='Product',
-        hover_data={
-            'Total_Qty': ':,.0f',
-            'Margin_Pct': ':.1f',
-            'Total_Revenue': ':,.0f',
-            'Total_Profit': ':,.0f',
-            'Branches': True,
-            'Category': True,
-        },
+        custom_data=['Total_Revenue', 'Total_Profit', 'Branches', 'Category'],
         color_discrete_map={
             '⭐ Star': '#2ecc71',
             '🐴 Plowhorse': '#3498db',
@@ -111,6 +101,9 @@ def menu_matrix_chart(chain_df, med_qty, med_margin):
             'Margin_Pct': 'Profit Margin %',
         },
         log_x=True,
+        render_mode='webgl',  # one point per product; WebGL keeps hover responsive
+        height=650,
+        template='plotly_white',
     )
 
     fig.add_hline(y=med_margin, line_dash='dash', line_color='gray', opacity=0.5,
@@ -118,11 +111,14 @@ def menu_matrix_chart(chain_df, med_qty, med_margin):
     fig.add_vline(x=med_qty, line_dash='dash', line_color='gray', opacity=0.5,
                   annotation_text=f'Median Qty: {med_qty:,.0f}')
 
-    fig.update_layout(
-        height=650,
-        template='plotly_white',
-        font=dict(family='Inter, sans-serif'),
-    )
+    # Fixed hovertemplate over customdata instead of per-column hover_data formatting
+    fig.update_traces(hovertemplate=(
+        '<b>%{hovertext}</b><br>Qty: %{x:,.0f}<br>Margin: %{y:.1f}%'
+        '<br>Revenue: %{customdata[0]:,.0f}<br>Profit: %{customdata[1]:,.0f}'
+        '<br>Branches: %{customdata[2]}<br>Category: %{customdata[3]}'
+        '<extra>%{fullData.name}</extra>'
+    ))
+    fig.update_layout(font=dict(family='Inter, sans-serif'))
 
     return fig
 
@@ -132,54 +128,52 @@ def modifier_attachment_analysis(product_df):
     Analyze modifier attachment rates across branches.
     Key modifiers: ADD SHOT, REPLACE ALT MILKS, DRIZZLES, WHIPPED CREAM.
     """
-    df = product_df[
-        (~product_df['IsAggregate']) &
-        (product_df['Qty'] > 0)
-    ].copy()
+    df = get_active_products(product_df)
 
     # Identify modifiers vs base drinks
-    modifier_keywords = ['ADD ', 'REPLACE ']
-    df['IsModifier'] = df['Product'].apply(
-        lambda x: any(x.startswith(kw) for kw in modifier_keywords) if isinstance(x, str) else False
-    )
-
-    # Per branch: modifier qty vs base beverage qty
-    branch_stats = []
-    for branch in df['Branch'].unique():
-        branch_df = df[df['Branch'] == branch]
-        bev_df = branch_df[branch_df['Category'] == 'BEVERAGES']
-
-        base_qty = bev_df[~bev_df['IsModifier']]['Qty'].sum()
-        modifier_qty = bev_df[bev_df['IsModifier']]['Qty'].sum()
-
-        modifier_profit = bev_df[bev_df['IsModifier']]['TotalProfit'].sum()
-        modifier_revenue = bev_df[bev_df['IsModifier']]['TrueRevenue'].sum()
-
-        attach_rate = modifier_qty / base_qty * 100 if base_qty > 0 else 0
-
-        branch_stats.append({
-            'Branch': branch,
-            'Branch_Short': branch.replace('Stories ', ''),
-            'Base_Beverage_Qty': base_qty,
-            'Modifier_Qty': modifier_qty,
-            'Attach_Rate_Pct': attach_rate,
-            'Modifier_Profit': modifier_profit,
-            'Modifier_Revenue': modifier_revenue,
-            'Modifier_Margin': modifier_profit / modifier_revenue * 100 if modifier_revenue > 0 else 0,
-        })
-
-    stats_df = pd.DataFrame(branch_stats).sort_values('Attach_Rate_Pct', ascending=False)
+    df = df.assign(IsModifier=df['Product'].str.startswith(MODIFIER_PREFIXES).fillna(False).astype(bool))
+
+    # Per branch: modifier qty vs base beverage qty, one groupby over beverages
+    branches = df.drop_duplicates('Branch')[['Branch', 'Branch_Short']]
+    bev = df[df['Category'] == 'BEVERAGES']
+    agg = bev.groupby(['Branch', 'IsModifier'], sort=False, observed=True).agg(
+        qty=('Qty', 'sum'),
+        profit=('TotalProfit', 'sum'),
+        revenue=('TrueRevenue', 'sum'),
+    ).unstack('IsModifier', fill_value=0).reindex(branches['Branch'], fill_value=0)
+
+    def _col(name, is_modifier):
+        if (name, is_modifier) in agg.columns:
+            return agg[(name, is_modifier)].to_numpy(dtype=float)
+        return np.zeros(len(agg))
+
+    base_qty = _col('qty', False)
+    modifier_qty = _col('qty', True)
+    modifier_profit = _col('profit', True)
+    modifier_revenue = _col('revenue', True)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        attach_rate = np.where(base_qty > 0, modifier_qty / base_qty * 100, 0)
+        modifier_margin = np.where(modifier_revenue > 0, modifier_profit / modifier_revenue * 100, 0)
+
+    stats_df = pd.DataFrame({
+        'Branch': branches['Branch'].to_numpy(),
+        'Branch_Short': branches['Branch_Short'].to_numpy(),
+        'Base_Beverage_Qty': base_qty,
+        'Modifier_Qty': modifier_qty,
+        'Attach_Rate_Pct': attach_rate,
+        'Modifier_Profit': modifier_profit,
+        'Modifier_Revenue': modifier_revenue,
+        'Modifier_Margin': modifier_margin,
+    }).sort_values('Attach_Rate_Pct', ascending=False)
 
     # Quantify opportunity: if all branches matched top performer
+    # (plain ndarray arithmetic on the per-branch arrays; no per-row Python loop)
     top_rate = stats_df['Attach_Rate_Pct'].max()
-    avg_modifier_profit_per_unit = stats_df['Modifier_Profit'].sum() / stats_df['Modifier_Qty'].sum() if stats_df['Modifier_Qty'].sum() > 0 else 0
+    total_modifier_qty = modifier_qty.sum()
+    avg_modifier_profit_per_unit = modifier_profit.sum() / total_modifier_qty if total_modifier_qty > 0 else 0
 
-    opportunity = 0
-    for _, row in stats_df.iterrows():
-        gap = top_rate - row['Attach_Rate_Pct']
-        additional_modifiers = row['Base_Beverage_Qty'] * gap / 100
-        additional_profit = additional_modifiers * avg_modifier_profit_per_unit
-        opportunity += additional_profit
+    opportunity = float(((top_rate - attach_rate) * base_qty / 100 * avg_modifier_profit_per_unit).sum())
 
     return stats_df, top_rate, opportunity
 
@@ -197,58 +191,48 @@ def modifier_chart(stats_df):
         color_continuous_scale='YlOrRd',
         title='Modifier Attachment Rate by Branch',
         labels={'Attach_Rate_Pct': 'Modifier Attach Rate %', 'Branch_Short': 'Branch'},
-        hover_data={
-            'Modifier_Qty': ':,.0f',
-            'Base_Beverage_Qty': ':,.0f',
-            'Modifier_Profit': ':,.0f',
-        },
-    )
-
-    fig.update_layout(
+        custom_data=['Modifier_Qty', 'Base_Beverage_Qty', 'Modifier_Profit'],
         height=600,
         template='plotly_white',
     )
 
+    fig.update_traces(hovertemplate=(
+        '<b>%{y}</b><br>Attach Rate: %{x:.1f}%'
+        '<br>Modifiers: %{customdata[0]:,.0f}<br>Base Beverages: %{customdata[1]:,.0f}'
+        '<br>Modifier Profit: %{customdata[2]:,.0f}<extra></extra>'
+    ))
+
     return fig
 
 
-def top_products_by_profit(product_df, n=20):
+@cache_per_frame
+def _product_profit_agg(product_df):
     """
-    Get top N products by total profit contribution (chain-wide).
+    Chain-wide per-product totals sorted by Total_Profit (ascending).
+    Shared by top_products_by_profit and bottom_products_by_profit.
     """
-    df = product_df[
-        (~product_df['IsAggregate']) &
-        (~product_df['Product'].str.startswith('Total')) &
-        (product_df['Qty'] > 0)
-    ].copy()
+    active = get_active_products(product_df)
+    df = active[~active['IsTotal']]
 
-    chain = df.groupby(['Product', 'Category']).agg(
+    chain = df.groupby(['Product', 'Category'], observed=True).agg(
         Total_Qty=('Qty', 'sum'),
         Total_Profit=('TotalProfit', 'sum'),
         Total_Revenue=('TrueRevenue', 'sum'),
         Avg_Margin=('ProfitPct', 'mean'),
     ).reset_index()
 
-    chain = chain.sort_values('Total_Profit', ascending=False).head(n)
-    return chain
+    return chain.sort_values('Total_Profit', ascending=True, kind='stable')
 
 
-def bottom_products_by_profit(product_df, n=20):
+def top_products_by_profit(product_df, n=20):
     """
-    Get bottom N products by total profit (worst performers, including losses).
+    Get top N products by total profit contribution (chain-wide).
     """
-    df = product_df[
-        (~product_df['IsAggregate']) &
-        (~product_df['Product'].str.startswith('Total')) &
-        (product_df['Qty'] > 0)
-    ].copy()
+    return _product_profit_agg(product_df).iloc[::-1].head(n)
 
-    chain = df.groupby(['Product', 'Category']).agg(
-        Total_Qty=('Qty', 'sum'),
-        Total_Profit=('TotalProfit', 'sum'),
-        Total_Revenue=('TrueRevenue', 'sum'),
-        Avg_Margin=('ProfitPct', 'mean'),
-    ).reset_index()
 
-    chain = chain.sort_values('Total_Profit', ascending=True).head(n)
-    return chain
+def bottom_products_by_profit(product_df, n=20):
+    """
+    Get bottom N products by total profit (worst performers, including losses).
+    """
+    return _product_profit_agg(product_df).head(n)
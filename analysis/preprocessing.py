@@ -0,0 +1,102 @@
+"""
+Stories Coffee — Shared Preprocessing
+======================================
+Filtered views and shared aggregates of the data frames that several analyzers need.
+Each view is computed once per DataFrame object and reused, so a full
+report run doesn't re-evaluate the same boolean masks in every module.
+Entry points opt into pandas Copy-on-Write via enable_copy_on_write().
+"""
+
+import functools
+import weakref
+
+import pandas as pd
+
+
+def enable_copy_on_write():
+    """
+    Turn on pandas Copy-on-Write for the whole process (call from entry points).
+
+    The analyzers add columns to filtered slices without defensive .copy()
+    calls; under CoW those slices are cheap lazily-copied views.  Results are
+    the same without it.  CoW is always on from pandas 3.0, where the option
+    is deprecated, so this only acts on pandas 2.x.
+    """
+    if int(pd.__version__.split('.')[0]) == 2:
+        pd.set_option('mode.copy_on_write', True)
+
+
+def cache_per_frame(func):
+    """
+    Memoize a single-DataFrame function on the identity of its argument.
+
+    The cache holds a weak reference to the input frame, so entries are
+    dropped when the frame is garbage collected.  Cached results are
+    shared between callers and must be treated as read-only.
+    """
+    cache = {}
+
+    @functools.wraps(func)
+    def wrapper(df):
+        key = id(df)
+        hit = cache.get(key)
+        if hit is not None and hit[0]() is df:
+            return hit[1]
+        result = func(df)
+        cache[key] = (weakref.ref(df), result)
+        weakref.finalize(df, cache.pop, key, None)
+        return result
+
+    wrapper.cache_clear = cache.clear
+    return wrapper
+
+
+@cache_per_frame
+def get_product_rows(product_df):
+    """
+    Individual (non-aggregate) product rows, whatever their quantity.
+    The returned frame is cached per product_df; do not mutate it.
+    """
+    return product_df.loc[~product_df['IsAggregate'].to_numpy(dtype=bool)]
+
+
+@cache_per_frame
+def get_active_products(product_df):
+    """
+    Individual (non-aggregate) product rows with Qty > 0.
+
+    This is the base filter for nearly every product-level analyzer.
+    The returned frame is cached per product_df; do not mutate it.
+    """
+    rows = get_product_rows(product_df)
+    return rows.loc[rows['Qty'].to_numpy() > 0]
+
+
+@cache_per_frame
+def get_branch_category_totals(category_df):
+    """
+    TrueRevenue / TotalProfit / Qty of the non-aggregate category rows,
+    summed per Branch with Category unstacked into columns (0 where missing).
+    Shared by the category-mix, quadrant and clustering features; cached per
+    category_df, do not mutate.
+    """
+    rows = category_df.loc[~category_df['IsAggregate'].to_numpy(dtype=bool)]
+    return (
+        rows.groupby(['Branch', 'Category'], observed=True)[['TrueRevenue', 'TotalProfit', 'Qty']].sum()
+        .unstack('Category', fill_value=0)
+    )
+
+
+@cache_per_frame
+def _year_frames(monthly_df):
+    return dict(list(monthly_df.groupby('Year', sort=False)))
+
+
+def get_year_rows(monthly_df, year):
+    """
+    Monthly sales rows for one Year (empty frame if the year is absent).
+
+    All years are split out in a single groupby, cached per monthly_df;
+    do not mutate the returned frame.
+    """
+    return _year_frames(monthly_df).get(year, monthly_df.iloc[:0])
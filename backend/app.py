@@ -15,11 +15,14 @@ The pipeline:
 
 import os
 import sys
+import gzip
 import json
+import hashlib
+import threading
 import traceback
-from io import BytesIO
+from collections import OrderedDict
 
-from flask import Flask, request, jsonify
+from flask import Flask, Response, request, jsonify
 from flask_cors import CORS
 
 # Add the project root to the path so we can import the analysis modules
@@ -30,48 +33,52 @@ import pandas as pd
 import numpy as np
 
 from data_cleaning import load_all_data, load_uploaded_data
-from analysis.branch_analysis import (
-    seasonality_analysis,
-    top_bottom_branches,
-    chain_kpis,
-    category_mix_analysis,
-)
-from analysis.margin_leaks import (
-    generate_margin_leak_report,
-    find_zero_revenue_modifiers,
-    free_modifiers_cost,
-    veggie_sub_analysis,
-    cheesecake_margin_analysis,
-    amioun_pricing_analysis,
-    find_negative_margin_products,
-)
-from analysis.menu_engineering import (
-    build_menu_matrix,
-    modifier_attachment_analysis,
-)
-from models.forecasting import (
-    forecast_all_branches,
-    compute_2026_projections,
-)
-from models.clustering import (
-    build_branch_features,
-    cluster_branches,
-    cluster_recommendations,
-)
+from analysis.preprocessing import enable_copy_on_write
+
+enable_copy_on_write()
+
+# The analysis and ML stack (plotly, scikit-learn) is imported on the first
+# pipeline run so /api/health and static files don't pay for it at startup.
+# Set PRELOAD_PIPELINE=1 to import eagerly (e.g. before forking workers).
+if os.environ.get("PRELOAD_PIPELINE", "0") == "1":
+    import analysis.branch_analysis
+    import analysis.margin_leaks
+    import analysis.menu_engineering
+    import models.forecasting
+    import models.clustering
 
 app = Flask(__name__)
 CORS(app)
 
 # ─── Pre-compute results from default data ───────────────────────────────────
 
+MONTH_COLS = ["January", "February", "March", "April", "May", "June",
+              "July", "August", "September", "October", "November", "December"]
+MONTH_ABBRS = ("Jan", "Feb", "Mar", "Apr", "May", "Jun",
+               "Jul", "Aug", "Sep", "Oct", "Nov", "Dec")
+
 _cached_result = None
+_cached_json = None      # _cached_result encoded once, served as-is
+_cached_gzip = None      # ...and gzipped once, for clients that accept it
+_cached_etag = None
+_cache_lock = threading.Lock()
 
+# Serialized /api/upload responses keyed by a hash of the uploaded files (LRU)
+UPLOAD_CACHE_SIZE = 8
+_upload_cache = OrderedDict()
+_upload_lock = threading.Lock()
 
-def _run_pipeline(data: dict) -> dict:
+
+def _run_pipeline(data: dict, cache_forecasts: bool = False) -> dict:
     """
     Execute the full analysis pipeline on 4 DataFrames and return
     a JSON-serializable dict matching the React AnalysisData interface.
 
+    With cache_forecasts, branch forecasts are reused from the on-disk
+    cache in data/cache/ (keyed by the monthly data and the model code and
+    version, so a deploy that changes the model refits), so a restarted
+    worker skips the model fits.  Uploaded data is never written there.
+
     Steps:
         1. Compute chain-level KPIs (revenue, profit, margin, counts)
         2. Build seasonality heatmap and monthly revenue series
@@ -82,6 +89,37 @@ def _run_pipeline(data: dict) -> dict:
         7. Cluster branches into 4 strategic segments via KMeans
         8. Assemble action plan with dollar-quantified impact estimates
     """
+    from analysis.branch_analysis import (
+        seasonality_analysis,
+        rank_branches,
+        top_bottom_branches,
+        chain_kpis,
+        category_mix_analysis,
+    )
+    from analysis.margin_leaks import (
+        generate_margin_leak_report,
+        find_zero_revenue_modifiers,
+        free_modifiers_cost,
+        veggie_sub_analysis,
+        cheesecake_margin_analysis,
+        amioun_pricing_analysis,
+        find_negative_margin_products,
+    )
+    from analysis.menu_engineering import (
+        build_menu_matrix,
+        modifier_attachment_analysis,
+    )
+    from models.forecasting import (
+        forecast_all_branches,
+        compute_2026_projections,
+        FORECAST_CACHE_DIR,
+    )
+    from models.clustering import (
+        build_branch_features,
+        cluster_branches,
+        cluster_recommendations,
+    )
+
     monthly    = data["monthly_sales"]
     products   = data["product_profitability"]
     categories = data["category_summary"]
@@ -89,38 +127,22 @@ def _run_pipeline(data: dict) -> dict:
     # ── Chain KPIs ──
     kpis_raw = chain_kpis(monthly, categories, products)
 
-    # ── Top / bottom branches ──
-    top_df, bottom_df = top_bottom_branches(monthly, n=5)
+    # ── Top / bottom branches (one 2025 ranking, reused by the heatmap) ──
+    ranked = rank_branches(monthly)
+    top_df, bottom_df = top_bottom_branches(monthly, n=5, ranked=ranked)
 
     # ── Seasonality (chain-monthly series) ──
     _, _, chain_monthly = seasonality_analysis(monthly)
-    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun",
-              "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
-    monthly_revenue = []
-    for i, m in enumerate(months):
-        val = float(chain_monthly.iloc[i]) / 1_000_000 if i < len(chain_monthly) else 0
-        monthly_revenue.append({"month": m, "revenue": round(val, 1)})
+    chain_monthly_m = (chain_monthly.reindex(MONTH_COLS, fill_value=0).to_numpy(dtype=np.float64) / 1_000_000).tolist()
+    monthly_revenue = [
+        {"month": m, "revenue": round(val, 1)} for m, val in zip(MONTH_ABBRS, chain_monthly_m)
+    ]
 
     # ── Branch × Month heatmap ──
-    heatmap_branches = []
-    branch_monthly = {}
-    for _, row in monthly.iterrows():
-        branch = str(row["Branch"])
-        if branch in heatmap_branches:
-            continue
-        heatmap_branches.append(branch)
-        vals = []
-        for m in months[:12]:
-            col = {"Jan": "January", "Feb": "February", "Mar": "March",
-                   "Apr": "April", "May": "May", "Jun": "June",
-                   "Jul": "July", "Aug": "August", "Sep": "September",
-                   "Oct": "October", "Nov": "November", "Dec": "December"}.get(m, m)
-            vals.append(int(row.get(col, 0)))
-        branch_monthly[branch] = vals
-    # Only keep top 13 by total revenue
-    sorted_branches = sorted(heatmap_branches, key=lambda b: sum(branch_monthly.get(b, [])), reverse=True)[:13]
-    heatmap_branches = sorted_branches
-    branch_monthly = {b: branch_monthly[b] for b in sorted_branches}
+    # Top 13 branches by 2025 revenue
+    heat = ranked.head(13).set_index("Branch")[MONTH_COLS].fillna(0).astype(np.int64)
+    heatmap_branches = heat.index.astype(str).tolist()
+    branch_monthly = dict(zip(heatmap_branches, heat.to_numpy().tolist()))
 
     # ── Margin leaks ──
     leak_df, total_leaks = generate_margin_leak_report(products)
@@ -131,14 +153,12 @@ def _run_pipeline(data: dict) -> dict:
     cheese_df, cheese_stats = cheesecake_margin_analysis(products)
     amioun_df, amioun_loss = amioun_pricing_analysis(products)
 
-    waterfall_data = []
-    leak_cards = []
-    for _, row in leak_df.iterrows():
-        waterfall_data.append({
-            "name": str(row["Leak"]),
-            "value": round(-abs(float(row["Annual_Loss"])) / 1_000_000, 1),
-            "color": "hsl(0 80% 55%)" if abs(float(row["Annual_Loss"])) > 5_000_000 else "hsl(25 80% 42%)",
-        })
+    losses = leak_df["Annual_Loss"].abs().to_numpy(dtype=np.float64)
+    colors = np.where(losses > 5_000_000, "hsl(0 80% 55%)", "hsl(25 80% 42%)")
+    waterfall_data = [
+        {"name": name, "value": round(-loss / 1_000_000, 1), "color": color}
+        for name, loss, color in zip(leak_df["Leak"].astype(str).tolist(), losses.tolist(), colors.tolist())
+    ]
 
     # Build leak cards (simplified — the full narrative is in defaultData)
     neg_total = float(neg_df["Loss_Amount"].sum()) if "Loss_Amount" in neg_df.columns else float(neg_df["TotalProfit"].sum())
@@ -191,61 +211,77 @@ def _run_pipeline(data: dict) -> dict:
     free_modifiers = []
     if not mod_summary.empty:
         top_mods = mod_summary.nlargest(10, "Total_Cost")
-        for _, row in top_mods.iterrows():
-            qty = int(row["Total_Qty"])
-            cost = float(row["Total_Cost"])
-            suggested = 10  # default suggested charge
-            free_modifiers.append({
-                "product": str(row["Product"]),
+        suggested = 10  # default suggested charge
+        free_modifiers = [
+            {
+                "product": product,
                 "quantity": qty,
                 "absorbedCost": round(cost),
                 "suggestedCharge": suggested,
                 "recoverable": round(qty * suggested * 0.3),
-            })
+            }
+            for product, qty, cost in zip(
+                top_mods["Product"].astype(str).tolist(),
+                top_mods["Total_Qty"].to_numpy().astype(np.int64).tolist(),
+                top_mods["Total_Cost"].to_numpy(dtype=np.float64).tolist(),
+            )
+        ]
 
     # ── Menu engineering ──
     matrix_df, med_qty, med_margin = build_menu_matrix(products)
-    menu_products = []
-    for _, row in matrix_df.head(25).iterrows():
-        menu_products.append({
-            "name": str(row["Product"])[:30],
-            "volume": int(row["Total_Qty"]),
-            "margin": round(float(row["Margin_Pct"]), 1),
-            "quadrant": str(row["Quadrant"]).lower(),
-        })
+    head = matrix_df.head(25)
+    menu_products = [
+        {"name": name[:30], "volume": volume, "margin": round(margin, 1), "quadrant": quadrant}
+        for name, volume, margin, quadrant in zip(
+            head["Product"].astype(str).tolist(),
+            head["Total_Qty"].to_numpy().astype(np.int64).tolist(),
+            head["Margin_Pct"].to_numpy(dtype=np.float64).tolist(),
+            head["Quadrant"].astype(str).str.lower().tolist(),
+        )
+    ]
 
-    quadrant_counts = matrix_df["Quadrant"].value_counts()
+    # Partition once by quadrant. Labels carry an emoji prefix ("⭐ Star"),
+    # so groups are keyed by the bare quadrant name.
+    quadrant_names = matrix_df["Quadrant"].cat.rename_categories(lambda label: label.split(" ", 1)[-1])
+    by_quadrant = dict(tuple(matrix_df.groupby(quadrant_names, observed=True)))
+    empty = matrix_df.iloc[:0]
+    stars = by_quadrant.get("Star", empty)
+    puzzles = by_quadrant.get("Puzzle", empty)
+    plowhorses = by_quadrant.get("Plowhorse", empty)
+    dogs = by_quadrant.get("Dog", empty)
     quadrants = [
         {
-            "name": f"Stars ({quadrant_counts.get('Star', 0)})",
+            "name": f"Stars ({len(stars)})",
             "icon": "Star", "desc": "Promote Aggressively", "color": "text-success",
-            "items": matrix_df[matrix_df["Quadrant"] == "Star"].nlargest(4, "Total_Profit")["Product"].tolist(),
+            "items": stars.nlargest(4, "Total_Profit")["Product"].tolist(),
         },
         {
-            "name": f"Puzzles ({quadrant_counts.get('Puzzle', 0)})",
+            "name": f"Puzzles ({len(puzzles)})",
             "icon": "Puzzle", "desc": "Market More", "color": "text-blue-500",
-            "items": matrix_df[matrix_df["Quadrant"] == "Puzzle"].nlargest(3, "Margin_Pct")["Product"].tolist(),
+            "items": puzzles.nlargest(3, "Margin_Pct")["Product"].tolist(),
         },
         {
-            "name": f"Plowhorses ({quadrant_counts.get('Plowhorse', 0)})",
+            "name": f"Plowhorses ({len(plowhorses)})",
             "icon": "Beef", "desc": "Reprice or Optimize", "color": "text-accent",
-            "items": matrix_df[matrix_df["Quadrant"] == "Plowhorse"].nlargest(3, "Total_Qty")["Product"].tolist(),
+            "items": plowhorses.nlargest(3, "Total_Qty")["Product"].tolist(),
         },
         {
-            "name": f"Dogs ({quadrant_counts.get('Dog', 0)})",
+            "name": f"Dogs ({len(dogs)})",
             "icon": "Dog", "desc": "Consider Removing", "color": "text-destructive",
-            "items": matrix_df[matrix_df["Quadrant"] == "Dog"].nsmallest(3, "Margin_Pct")["Product"].tolist(),
+            "items": dogs.nsmallest(3, "Margin_Pct")["Product"].tolist(),
         },
     ]
 
     # ── Modifier attach rates ──
     mod_stats, top_rate, opportunity = modifier_attachment_analysis(products)
-    modifier_attach_rates = []
-    for _, row in mod_stats.nlargest(11, "Attach_Rate_Pct").iterrows():
-        modifier_attach_rates.append({
-            "branch": str(row.get("Branch_Short", row.get("Branch", ""))),
-            "rate": round(float(row["Attach_Rate_Pct"]), 1),
-        })
+    top_attach = mod_stats.nlargest(11, "Attach_Rate_Pct")
+    modifier_attach_rates = [
+        {"branch": branch, "rate": round(rate, 1)}
+        for branch, rate in zip(
+            top_attach["Branch_Short"].astype(str).tolist(),
+            top_attach["Attach_Rate_Pct"].to_numpy(dtype=np.float64).tolist(),
+        )
+    ]
 
     modifier_playbook = [
         {"step": 1, "text": "Train baristas on suggestive selling"},
@@ -256,62 +292,62 @@ def _run_pipeline(data: dict) -> dict:
     ]
 
     # ── Forecasting ──
-    forecasts = forecast_all_branches(monthly)
+    forecasts = forecast_all_branches(monthly, cache_dir=FORECAST_CACHE_DIR if cache_forecasts else None)
     projections = compute_2026_projections(monthly, forecasts)
     total_2026 = float(projections["Projected_2026_Total"].sum()) if not projections.empty else 0
 
-    forecast_data = []
-    chain_forecast = forecasts.groupby("Month").agg({"yhat": "sum", "yhat_lower": "sum", "yhat_upper": "sum"}).reindex(range(1, 13), fill_value=0)
-    for i, m in enumerate(months):
-        actual_val = monthly_revenue[i]["revenue"] if i < len(monthly_revenue) else 0
-        fc = float(chain_forecast.loc[i + 1, "yhat"]) / 1e6 if (i + 1) in chain_forecast.index else 0
-        lo = float(chain_forecast.loc[i + 1, "yhat_lower"]) / 1e6 if (i + 1) in chain_forecast.index else 0
-        hi = float(chain_forecast.loc[i + 1, "yhat_upper"]) / 1e6 if (i + 1) in chain_forecast.index else 0
-        forecast_data.append({
+    chain_forecast = (
+        forecasts.groupby("Month")[["yhat", "yhat_lower", "yhat_upper"]].sum()
+        .reindex(range(1, 13), fill_value=0)
+    )
+    forecast_data = [
+        {
             "month": m,
-            "actual": actual_val,
+            "actual": actual["revenue"],
             "forecast": round(fc, 1),
             "low": round(lo, 1),
             "high": round(hi, 1),
-        })
+        }
+        for m, actual, (fc, lo, hi) in zip(
+            MONTH_ABBRS, monthly_revenue, (chain_forecast.to_numpy(dtype=np.float64) / 1e6).tolist()
+        )
+    ]
 
     top_forecasts = []
     if not projections.empty:
-        for _, row in projections.nlargest(5, "Projected_2026_Total").iterrows():
-            growth = float(row.get("YoY_Growth_Pct", 0))
-            top_forecasts.append({
-                "branch": str(row["Branch"]),
-                "projected": f"{float(row['Projected_2026_Total'])/1e6:.1f}M",
+        top_proj = projections.nlargest(5, "Projected_2026_Total")
+        top_forecasts = [
+            {
+                "branch": branch,
+                "projected": f"{projected/1e6:.1f}M",
                 "growth": f"{'+' if growth >= 0 else ''}{growth:.0f}%",
-            })
+            }
+            for branch, projected, growth in zip(
+                top_proj["Branch"].astype(str).tolist(),
+                top_proj["Projected_2026_Total"].to_numpy(dtype=np.float64).tolist(),
+                top_proj["YoY_Growth_Pct"].to_numpy(dtype=np.float64).tolist(),
+            )
+        ]
 
     # ── Clustering ──
     features = build_branch_features(monthly, categories, products)
     clustered, _, _ = cluster_branches(features)
     recs = cluster_recommendations(clustered)
 
-    radar_data = []
-    # Build radar from cluster means
+    # Build radar from cluster means, each axis normalized to 0-100 across branches
     feature_cols = ["Total_Revenue", "Growth_Pct", "Profit_Margin_Pct",
                     "Beverage_Share_Pct", "Seasonality_CV", "Revenue_Per_Month"]
     axis_labels = ["Revenue", "Growth", "Margin", "Bev Mix", "Seasonality", "Efficiency"]
-    cluster_names = sorted(clustered["Cluster"].unique())
-
-    for i, axis in enumerate(axis_labels):
-        point = {"axis": axis}
-        for cn in cluster_names:
-            subset = clustered[clustered["Cluster"] == cn]
-            if len(subset) > 0 and i < len(feature_cols):
-                col = feature_cols[i]
-                val = float(subset[col].mean())
-                # Normalize to 0-100
-                full_range = float(clustered[col].max() - clustered[col].min())
-                if full_range > 0:
-                    normalized = (val - float(clustered[col].min())) / full_range * 100
-                else:
-                    normalized = 50
-                point[cn.replace(" ", "_").lower()] = round(normalized)
-        radar_data.append(point)
+    means = clustered.groupby("Cluster")[feature_cols].mean()
+    stats = clustered[feature_cols].agg(["min", "max"])
+    full_range = (stats.loc["max"] - stats.loc["min"]).where(lambda r: r > 0)
+    norm = ((means - stats.loc["min"]) / full_range * 100).fillna(50).round().astype(int)
+    cluster_keys = [cn.replace(" ", "_").lower() for cn in norm.index]
+
+    radar_data = [
+        {"axis": axis, **dict(zip(cluster_keys, norm[col].tolist()))}
+        for axis, col in zip(axis_labels, feature_cols)
+    ]
 
     icon_map = {"Cash Cows": "Coins", "Established": "BarChart3", "Growth Engines": "Rocket", "Event/Specialty": "PartyPopper"}
     color_map = {"Cash Cows": "hsl(32 95% 52%)", "Established": "hsl(210 80% 55%)",
@@ -336,22 +372,21 @@ def _run_pipeline(data: dict) -> dict:
 
     # ── Category split ──
     _, bev_share = category_mix_analysis(categories)
-    cat_agg = categories[~categories["IsAggregate"]].groupby("Category").agg({
-        "TrueRevenue": "sum", "TotalProfit": "sum", "TotalCost": "sum"
-    }).reset_index()
-    category_split = []
-    for _, row in cat_agg.iterrows():
-        rev = float(row["TrueRevenue"])
-        profit = float(row["TotalProfit"])
-        margin = (profit / rev * 100) if rev > 0 else 0
-        color = "hsl(32 95% 52%)" if "bev" in str(row["Category"]).lower() else "hsl(25 80% 28%)"
-        category_split.append({
-            "name": str(row["Category"]),
-            "revenue": round(rev),
-            "profit": round(profit),
-            "margin": round(margin, 1),
-            "color": color,
-        })
+    cat_agg = categories[~categories["IsAggregate"]].groupby("Category", observed=True)[
+        ["TrueRevenue", "TotalProfit"]
+    ].sum().reset_index()
+    rev = cat_agg["TrueRevenue"].to_numpy(dtype=np.float64)
+    profit = cat_agg["TotalProfit"].to_numpy(dtype=np.float64)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        margin = np.where(rev > 0, profit / rev * 100, 0.0)
+    category_split = pd.DataFrame({
+        "name": cat_agg["Category"].astype(str),
+        "revenue": np.round(rev).astype(np.int64),
+        "profit": np.round(profit).astype(np.int64),
+        "margin": np.round(margin, 1),
+        "color": np.where(cat_agg["Category"].astype(str).str.lower().str.contains("bev"),
+                          "hsl(32 95% 52%)", "hsl(25 80% 28%)"),
+    }).to_dict("records")
 
     # ── Build KPI list ──
     kpi_list = [
@@ -375,17 +410,17 @@ def _run_pipeline(data: dict) -> dict:
     ]
 
     # ── Top/bottom branches ──
-    top_branches = [
-        {"rank": i + 1, "name": str(row["Branch"]),
-         "revenue": f"{float(row['Total_By_Year'])/1e6:.1f}M"}
-        for i, (_, row) in enumerate(top_df.iterrows())
-    ]
-    bottom_branches = [
-        {"rank": kpis_raw["n_branches"] - len(bottom_df) + i + 1,
-         "name": str(row["Branch"]),
-         "revenue": f"{float(row['Total_By_Year'])/1e6:.1f}M"}
-        for i, (_, row) in enumerate(bottom_df.iterrows())
-    ]
+    def _branch_records(df, first_rank):
+        return [
+            {"rank": first_rank + i, "name": name, "revenue": f"{revenue/1e6:.1f}M"}
+            for i, (name, revenue) in enumerate(zip(
+                df["Branch"].astype(str).tolist(),
+                df["Total_By_Year"].to_numpy(dtype=np.float64).tolist(),
+            ))
+        ]
+
+    top_branches = _branch_records(top_df, 1)
+    bottom_branches = _branch_records(bottom_df, kpis_raw["n_branches"] - len(bottom_df) + 1)
 
     # ── Action plan ──
     action_plan = [
@@ -451,12 +486,29 @@ def health():
 @app.route("/api/data", methods=["GET"])
 def get_default_data():
     """Return pre-computed analysis results from default data."""
-    global _cached_result
+    global _cached_result, _cached_json, _cached_gzip, _cached_etag
     try:
-        if _cached_result is None:
-            data = load_all_data()
-            _cached_result = _run_pipeline(data)
-        return jsonify(_cached_result)
+        if _cached_json is None:
+            with _cache_lock:
+                # Re-check: a concurrent cold request may have built it already
+                if _cached_json is None:
+                    data = load_all_data()
+                    _cached_result = _run_pipeline(data, cache_forecasts=True)
+                    _cached_json = f"{app.json.dumps(_cached_result)}\n".encode()
+                    _cached_gzip = gzip.compress(_cached_json, compresslevel=6)
+                    _cached_etag = hashlib.md5(_cached_json).hexdigest()
+
+        if request.accept_encodings["gzip"] > 0:  # quality, so "gzip;q=0" opts out
+            response = Response(_cached_gzip, mimetype=app.json.mimetype)
+            response.content_encoding = "gzip"
+            response.set_etag(f"{_cached_etag}-gzip")
+        else:
+            response = Response(_cached_json, mimetype=app.json.mimetype)
+            response.set_etag(_cached_etag)
+        response.vary.add("Accept-Encoding")
+        response.cache_control.public = True
+        response.cache_control.max_age = 300
+        return response.make_conditional(request)
     except Exception as e:
         traceback.print_exc()
         return jsonify({"error": str(e)}), 500
@@ -473,19 +525,35 @@ def upload_and_analyze():
         if len(uploaded_files) < 1:
             return jsonify({"error": "No files uploaded"}), 400
 
-        # Build a dict of filename → file-like objects for load_uploaded_data
-        files_dict = {}
-        for f in uploaded_files:
-            files_dict[f.filename] = BytesIO(f.read())
+        # Hash each upload straight off its spooled stream, then rewind it for the parser
+        streams = {f.filename: f.stream for f in uploaded_files}
+        digest = hashlib.sha256()
+        for name in sorted(streams):
+            digest.update(name.encode())
+            digest.update(hashlib.file_digest(streams[name], "sha256").digest())
+            streams[name].seek(0)
+        key = digest.hexdigest()
+
+        with _upload_lock:
+            body = _upload_cache.get(key)
+            if body is not None:
+                _upload_cache.move_to_end(key)
 
-        # Run the cleaning pipeline
-        data = load_uploaded_data(files_dict)
+        if body is None:
+            # Run the cleaning pipeline on the upload streams themselves
+            data = load_uploaded_data(streams)
 
-        # Run the full analysis
-        result = _run_pipeline(data)
-        result["datasetName"] = "Uploaded Data"
+            # Run the full analysis
+            result = _run_pipeline(data)
+            result["datasetName"] = "Uploaded Data"
+            body = f"{app.json.dumps(result)}\n".encode()
 
-        return jsonify(result)
+            with _upload_lock:
+                _upload_cache[key] = body
+                while len(_upload_cache) > UPLOAD_CACHE_SIZE:
+                    _upload_cache.popitem(last=False)
+
+        return Response(body, mimetype=app.json.mimetype)
 
     except Exception as e:
         traceback.print_exc()
@@ -500,6 +568,30 @@ def upload_and_analyze():
 HF_MODEL = "meta-llama/Llama-4-Scout-17B-16E-Instruct:nscale"
 HF_API_URL = "https://router.huggingface.co/v1/chat/completions"
 
+_hf_session = None
+_hf_session_lock = threading.Lock()
+
+
+def _get_hf_session():
+    """Shared requests.Session so chat calls reuse pooled keep-alive TLS connections."""
+    global _hf_session
+    if _hf_session is None:
+        with _hf_session_lock:
+            if _hf_session is None:
+                import requests
+                from requests.adapters import HTTPAdapter
+                from urllib3.util.retry import Retry
+
+                session = requests.Session()
+                session.mount("https://", HTTPAdapter(
+                    pool_connections=8,
+                    pool_maxsize=16,
+                    max_retries=Retry(total=2, backoff_factor=0.2),
+                ))
+                _hf_session = session
+    return _hf_session
+
+
 @app.route("/api/chat", methods=["POST"])
 def chat():
     """
@@ -523,8 +615,7 @@ def chat():
             {"role": "user", "content": user_message},
         ]
 
-        import requests as http_requests
-        hf_response = http_requests.post(
+        hf_response = _get_hf_session().post(
             HF_API_URL,
             headers={
                 "Authorization": f"Bearer {hf_token}",
@@ -579,5 +670,10 @@ if __name__ == "__main__":
     debug = os.environ.get("FLASK_DEBUG", "0") == "1"
     print(f"🚀 Stories Coffee Backend starting on port {port}")
     print(f"   Static dir: {STATIC_DIR}")
-    print(f"   HF Token: {'configured' if HF_TOKEN else 'NOT SET — chat will fail'}")
-    app.run(host="0.0.0.0", port=port, debug=debug)
+    print(f"   HF Token: {'configured' if os.environ.get('HF_TOKEN') else 'NOT SET — chat will fail'}")
+    if os.environ.get("USE_WAITRESS", "1") == "1" and not debug:
+        # Production WSGI server: multi-threaded, keep-alive
+        from waitress import serve
+        serve(app, host="0.0.0.0", port=port, threads=8)
+    else:
+        app.run(host="0.0.0.0", port=port, debug=debug, threaded=True)
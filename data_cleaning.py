@@ -14,14 +14,40 @@ Usage:
 
 import pandas as pd
 import numpy as np
+import pyarrow.parquet as pq
 import re
 import os
+import json
 import csv
-import io
+import functools
+import hashlib
+import threading
 import warnings
+from concurrent.futures import ThreadPoolExecutor
 warnings.filterwarnings('ignore')
 
 
+class _LineFeed:
+    """One-line-at-a-time source for a long-lived csv.reader."""
+
+    def __init__(self):
+        self.line = None
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        line, self.line = self.line, None
+        if line is None:
+            raise StopIteration
+        return line
+
+
+# One reader per thread, reused for every line instead of building a
+# StringIO + csv.reader per call (the backend may parse uploads concurrently).
+_csv_local = threading.local()
+
+
 def csv_split(line):
     """Split a CSV line properly handling quoted fields with commas.
 
@@ -29,11 +55,13 @@ def csv_split(line):
     str.split(',') would break numeric values.  We delegate to Python's
     csv.reader which respects RFC 4180 quoting rules.
     """
-    try:
-        reader = csv.reader(io.StringIO(line))
-        return next(reader)
-    except StopIteration:
-        return []
+    parser = getattr(_csv_local, 'parser', None)
+    if parser is None:
+        feed = _LineFeed()
+        parser = _csv_local.parser = (feed, csv.reader(feed))
+    feed, reader = parser
+    feed.line = line
+    return next(reader, [])
 
 # ============================================================
 # BRANCH NAME NORMALIZATION
@@ -99,6 +127,61 @@ REGION_MAP = {
 }
 
 
+# Hierarchy markers in the report's first column: known branch names
+# (every raw variant), service types, and top-level product categories
+KNOWN_BRANCHES = frozenset(BRANCH_NAME_MAP)
+SERVICE_TYPES = frozenset({'TAKE AWAY', 'TABLE', 'Toters'})
+PRODUCT_CATEGORIES = frozenset({'BEVERAGES', 'FOOD'})
+
+
+# Low-cardinality label columns stored as pandas Categorical so groupbys and
+# masks work on integer codes instead of hashing the same strings per row.
+# (~13k product rows carry only ~550 distinct product names.)
+CATEGORICAL_COLUMNS = ['Branch', 'Branch_Raw', 'Branch_Short', 'Category', 'Section',
+                       'ServiceType', 'Region', 'Product', 'Division', 'Group',
+                       'AggLevel', 'Barcode']
+
+
+# Product-family patterns, compiled once for the flag columns in parse_product_profitability
+SUB_RE = re.compile(r'SUB|SANDWICH', re.IGNORECASE)
+CHEESECAKE_RE = re.compile(r'CHEESE ?CAKE', re.IGNORECASE)
+
+# Section rows in the product profitability report: any of these substrings
+# (case-insensitive) on a short row, or one of the exact section names
+SECTION_RE = re.compile(
+    'SECTION|ROLLS|PASTRY|COOKIES|CROISSANT|YOGHURT|DONUTS|SANDWICHES|SUBS|OFFER'
+    '|SALADS BAR|CARTON|NOT USED|HEALTHY|POP UP|GRAB', re.IGNORECASE)
+SECTION_NAMES = frozenset({'CINNAMON ROLLS', 'FRENCH PASTRY', 'COFFEE PASTRY', 'FROZEN YOGHURT'})
+
+# POS page headers: a print date like "22-Jan-26", or a repeated column header row
+PAGE_HEADER_RE = re.compile(r'\d{1,2}-\w{3}-\d{2}')
+HEADER_PREFIXES = ('Product Desc,', 'Description,', 'Category,')
+
+# Comparative Monthly Sales layout: report years, and a field count wider than any row
+MONTHLY_YEARS = ('2025', '2026')
+MONTHLY_MAX_FIELDS = 32
+
+
+def to_categorical(df):
+    """Convert the label columns in CATEGORICAL_COLUMNS to category dtype."""
+    for col in CATEGORICAL_COLUMNS:
+        if col in df.columns:
+            df[col] = df[col].astype('category')
+    return df
+
+
+def compact_dtypes(df):
+    """
+    Shrink a parsed frame: label columns to category, integer columns to the
+    narrowest integer type.  Money and quantity floats stay float64 — chain
+    totals run past 1e7, where float32 sums would visibly round.
+    """
+    to_categorical(df)
+    for col in df.select_dtypes('int64').columns:
+        df[col] = pd.to_numeric(df[col], downcast='integer')
+    return df
+
+
 def normalize_branch(name):
     """Normalize branch name using the mapping."""
     if not isinstance(name, str):
@@ -112,30 +195,46 @@ def get_region(branch_name):
     return REGION_MAP.get(branch_name, "Unknown")
 
 
+def _map_distinct(s, func):
+    """Apply a scalar mapping once per distinct value of s and broadcast back to rows."""
+    codes, uniques = pd.factorize(s, use_na_sentinel=False)
+    return pd.Series(uniques.map(func).to_numpy(dtype=object)[codes], index=s.index)
+
+
+def normalize_branch_series(s):
+    """Vectorized normalize_branch: ~25 distinct names per column, not one strip per row."""
+    return _map_distinct(s, normalize_branch)
+
+
+def get_region_series(branches):
+    """Vectorized get_region over a column of normalized branch names."""
+    return _map_distinct(branches, get_region)
+
+
 def is_page_header(line):
     """Detect POS report page headers."""
-    if not isinstance(line, str):
+    if not isinstance(line, str) or not line:
         return False
-    # Match date patterns like "22-Jan-26" or "19-Jan-26"
-    if re.match(r'^\d{1,2}-\w{3}-\d{2}', line):
+    # Match date patterns like "22-Jan-26" or "19-Jan-26" (only lines starting with a digit)
+    if line[0].isdigit() and PAGE_HEADER_RE.match(line):
         return True
     # Match column header rows
-    if line.startswith('Product Desc,') or line.startswith('Description,') or line.startswith('Category,'):
-        return True
-    return False
+    return line.startswith(HEADER_PREFIXES)
 
 
-def parse_number(val):
-    """Parse a number string with commas into float."""
-    if pd.isna(val) or val == '' or val is None:
-        return 0.0
-    if isinstance(val, (int, float)):
-        return float(val)
-    val = str(val).strip().replace(',', '')
-    try:
-        return float(val)
-    except ValueError:
-        return 0.0
+def read_report_text(source):
+    """Whole report as text, from a file path or an open (text or binary) file object."""
+    if hasattr(source, 'read'):
+        content = source.read()
+        return content.decode('utf-8') if isinstance(content, bytes) else content
+    with open(source, 'r', encoding='utf-8') as f:
+        return f.read()
+
+
+def parse_number_series(s):
+    """Parse a whole column of number strings with commas into float (unparseable -> 0.0)."""
+    cleaned = s.astype(str).str.strip().str.replace(',', '', regex=False)
+    return pd.to_numeric(cleaned, errors='coerce').fillna(0.0).astype(np.float64)
 
 
 # ============================================================
@@ -147,107 +246,57 @@ def parse_monthly_sales(filepath):
     Returns DataFrame with columns:
     [Year, Branch, Jan-Dec monthly values, Total_By_Year, Region]
     """
-    with open(filepath, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
-
-    records = []
-    current_year = None
     months = ['January', 'February', 'March', 'April', 'May', 'June',
               'July', 'August', 'September', 'October', 'November', 'December']
 
-    for line in lines:
-        line = line.strip()
-        if not line:
-            continue
+    # One C-level parse of the whole report; rows are ragged, so read into a
+    # fixed-width frame of strings and classify rows with column masks.
+    raw = pd.read_csv(filepath, header=None, names=range(MONTHLY_MAX_FIELDS), dtype=str,
+                      engine='c', na_filter=False, skip_blank_lines=True, encoding='utf-8')
+    raw = raw.fillna('').apply(lambda col: col.str.strip())
+    first, branch = raw[0], raw[1]
 
-        # Skip report headers
-        if line.startswith('Stories,') and 'Stories ' not in csv_split(line)[1]:
-            continue
-        if 'Comparative Monthly' in line or 'Page ' in line:
-            continue
-        if line.startswith(',,,') and ('January' in line or 'October' in line):
-            continue
+    # Year appears only on the first row of each block; carry it down
+    year_mask = first.isin(MONTHLY_YEARS)
+    year = first.where(year_mask).ffill()
 
-        parts = [p.strip() for p in csv_split(line)]
-
-        # Detect year row
-        if parts[0] in ('2025', '2026'):
-            current_year = int(parts[0])
-            # This row also has branch data
-            branch_name = parts[1] if len(parts) > 1 else ''
-            if branch_name and branch_name != 'Total':
-                values = parts[2:]  # remaining are month values or total
-                record = {'Year': current_year, 'Branch_Raw': branch_name}
-                records.append((record, values))
-            elif branch_name == 'Total':
-                record = {'Year': current_year, 'Branch_Raw': 'Total'}
-                records.append((record, parts[2:]))
-            continue
+    # The POS export splits each branch across two CSV "pages":
+    #   Page 1 → Jan through Sep (up to 9 values), under a "January" header row
+    #   Page 2 → Oct through Dec + Total_By_Year (up to 4 values), under an "October" header row
+    cells = raw.to_numpy()
+    page = pd.Series(np.select([(cells == 'January').any(axis=1), (cells == 'October').any(axis=1)],
+                               [1, 2], 0), index=raw.index).replace(0, np.nan).ffill()
 
-        # Continuation rows (year carried over)
-        if parts[0] == '' and len(parts) > 1 and parts[1]:
-            branch_name = parts[1]
-            values = parts[2:]
-            if current_year and branch_name:
-                record = {'Year': current_year, 'Branch_Raw': branch_name}
-                records.append((record, values))
-            continue
+    # Branch rows only; the report's own 'Total' rows are dropped here, before any merging
+    data_mask = ((year_mask | (first == '')) & ~branch.isin(('', 'Total'))
+                 & year.notna() & page.notna())
+    rows = raw[data_mask]
+    values = cells[data_mask.to_numpy(), 2:]
 
-    # --- Two-pass assembly ---
-    # The POS export splits each branch across two CSV "pages":
-    #   Page 1 → Jan through Sep (up to 9 values)
-    #   Page 2 → Oct through Dec + Total_By_Year (up to 4 values)
-    # We merge both pages by keying on (year, branch).
-    branch_data = {}  # key = (year, branch), value = list of 13 floats
-
-    for record, values in records:
-        key = (record['Year'], record['Branch_Raw'])
-        if key not in branch_data:
-            branch_data[key] = [0.0] * 13  # 12 months + total
-
-        # Parse numeric values
-        nums = [parse_number(v) for v in values if v.strip() != '']
-
-        # Determine which months these values correspond to
-        existing = branch_data[key]
-        # Count how many non-zero values already exist
-        filled = sum(1 for x in existing[:12] if x != 0.0)
-
-        if filled == 0:
-            # First batch: Jan-Sep (up to 9 values)
-            for i, n in enumerate(nums[:9]):
-                existing[i] = n
-        else:
-            # Second batch: Oct-Dec + Total (up to 4 values)
-            for i, n in enumerate(nums[:3]):
-                existing[9 + i] = n
-            if len(nums) >= 4:
-                existing[12] = nums[3]  # Total By Year
-
-    # Build DataFrame
-    rows = []
-    for (year, branch_raw), vals in branch_data.items():
-        branch = normalize_branch(branch_raw)
-        row = {
-            'Year': year,
-            'Branch': branch,
-            'Branch_Raw': branch_raw,
-            'Region': get_region(branch),
-        }
-        for i, m in enumerate(months):
-            row[m] = vals[i]
-        row['Total_By_Year'] = vals[12]
-        rows.append(row)
-
-    df = pd.DataFrame(rows)
-    # Remove 'Total' rows
-    df = df[df['Branch'] != 'Total'].reset_index(drop=True)
-
-    # Fix: if Total_By_Year is 0, compute from months
-    mask = df['Total_By_Year'] == 0
-    df.loc[mask, 'Total_By_Year'] = df.loc[mask, months].sum(axis=1)
+    # Left-align the non-empty value cells (page 1 has a spare empty column)
+    order = np.argsort(values == '', axis=1, kind='stable')
+    values = np.take_along_axis(values, order, axis=1)[:, :9]
+    nums = parse_number_series(pd.Series(values.ravel())).to_numpy().reshape(values.shape)
 
-    return df
+    # Scatter each page into its slots of the 12 months + total, then merge the pages
+    wide = np.zeros((len(rows), 13))
+    first_page = (page[data_mask] == 1).to_numpy()
+    wide[first_page, :9] = nums[first_page, :9]
+    wide[~first_page, 9:] = nums[~first_page, :4]
+
+    df = pd.DataFrame(wide, columns=months + ['Total_By_Year'])
+    df.insert(0, 'Year', year[data_mask].astype(int).to_numpy())
+    df.insert(1, 'Branch_Raw', rows[1].to_numpy())
+    df = df.groupby(['Year', 'Branch_Raw'], sort=False).sum().reset_index()
+
+    df.insert(1, 'Branch', normalize_branch_series(df['Branch_Raw']))
+    df.insert(3, 'Region', get_region_series(df['Branch']))
+
+    # Fix: if Total_By_Year is 0, compute from months (float64: totals run to ~1e8)
+    totals = df['Total_By_Year'].to_numpy()
+    df['Total_By_Year'] = np.where(totals != 0, totals, df[months].to_numpy().sum(axis=1))
+
+    return compact_dtypes(df)
 
 
 # ============================================================
@@ -260,8 +309,8 @@ def parse_product_profitability(filepath):
     [Branch, ServiceType, Category, Section, Product, Qty, TotalPrice,
      TotalCost, CostPct, TotalProfit, ProfitPct, TrueRevenue, IsAggregate]
     """
-    with open(filepath, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+    # One read; splitlines() drops the line endings, so lines need no strip pass
+    lines = read_report_text(filepath).splitlines()
 
     records = []
     current_branch = None
@@ -269,20 +318,12 @@ def parse_product_profitability(filepath):
     current_category = None
     current_section = None
 
-    # Known branch names (from the data)
-    known_branches = set(BRANCH_NAME_MAP.keys())
-    # Service types
-    service_types = {'TAKE AWAY', 'TABLE', 'Toters'}
-    # Categories
-    categories = {'BEVERAGES', 'FOOD'}
-
     for line in lines:
-        line = line.strip()
-        if not line:
+        if not line or line.isspace():
             continue
 
         # Skip page headers
-        if re.match(r'^\d{1,2}-\w{3}-\d{2}', line):
+        if PAGE_HEADER_RE.match(line):
             continue
         if line.startswith('Product Desc,Qty'):
             continue
@@ -293,11 +334,11 @@ def parse_product_profitability(filepath):
         if 'Copyright' in line or 'omegapos' in line.lower():
             continue
 
-        parts = [p.strip() for p in csv_split(line)]
+        parts = csv_split(line)
         first = parts[0].strip()
 
         # Detect branch
-        if first in known_branches:
+        if first in KNOWN_BRANCHES:
             current_branch = first
             current_service = None
             current_category = None
@@ -305,29 +346,24 @@ def parse_product_profitability(filepath):
             continue
 
         # Detect service type
-        if first in service_types:
+        if first in SERVICE_TYPES:
             current_service = first
             current_category = None
             current_section = None
             continue
 
         # Detect category
-        if first in categories:
+        if first in PRODUCT_CATEGORIES:
             current_category = first
             current_section = None
             continue
 
         # Detect section (ends with SECTION, ROLLS, etc. or is a known division)
-        section_patterns = [
-            'SECTION', 'ROLLS', 'PASTRY', 'COOKIES', 'CROISSANT', 'YOGHURT',
-            'DONUTS', 'SANDWICHES', 'SUBS', 'OFFER', 'SALADS BAR', 'CARTON',
-            'NOT USED', 'HEALTHY', 'POP UP', 'GRAB'
-        ]
-        if any(pat in first.upper() for pat in section_patterns) and len(parts) < 3:
+        if len(parts) < 3 and SECTION_RE.search(first):
             current_section = first
             continue
         # Also handle exact matches
-        if first in ['CINNAMON ROLLS', 'FRENCH PASTRY', 'COFFEE PASTRY', 'FROZEN YOGHURT']:
+        if first in SECTION_NAMES:
             current_section = first
             continue
 
@@ -336,56 +372,53 @@ def parse_product_profitability(filepath):
         if first.startswith('Total By') or first.startswith('Total by'):
             is_aggregate = True
 
-        # Parse product data rows (need at least qty and some financial data)
+        # Parse product data rows (need at least qty and some financial data).
+        # Numbers are kept as raw, unstripped strings here; parse_number_series
+        # strips and parses them per column below.
         if len(parts) >= 8:
-            qty = parse_number(parts[1])
-            total_price = parse_number(parts[2])
-            # parts[3] is empty spacer
-            total_cost = parse_number(parts[4])
-            cost_pct = parse_number(parts[5])
-            total_profit = parse_number(parts[6])
-            # parts[7] is empty spacer
-            profit_pct = parse_number(parts[8]) if len(parts) > 8 else 0.0
-
-            # Skip rows with all zeros and no meaningful product name
-            if qty == 0 and total_price == 0 and total_cost == 0 and total_profit == 0 and not is_aggregate:
-                continue
-
-            # Compute true revenue — critical data quality fix.
-            # The POS truncates TotalPrice at large values (overflow bug).
-            # For aggregate rows, TotalPrice is ALWAYS unreliable.
-            # TrueRevenue = TotalCost + TotalProfit is algebraically exact.
-            if is_aggregate:
-                true_revenue = total_cost + total_profit
-            else:
-                true_revenue = total_price if total_price > 0 else (total_cost + total_profit)
-
-            records.append({
-                'Branch_Raw': current_branch,
-                'Branch': normalize_branch(current_branch) if current_branch else None,
-                'ServiceType': current_service,
-                'Category': current_category,
-                'Section': current_section,
-                'Product': first,
-                'Qty': qty,
-                'TotalPrice': total_price,
-                'TotalCost': total_cost,
-                'CostPct': cost_pct,
-                'TotalProfit': total_profit,
-                'ProfitPct': profit_pct,
-                'TrueRevenue': true_revenue,
-                'IsAggregate': is_aggregate,
-            })
-
-    df = pd.DataFrame(records)
+            # parts[3] and parts[7] are empty spacers
+            records.append((
+                current_branch, current_service, current_category, current_section, first,
+                parts[1], parts[2], parts[4], parts[5], parts[6],
+                parts[8] if len(parts) > 8 else '',
+                is_aggregate,
+            ))
+
+    df = pd.DataFrame(records, columns=['Branch_Raw', 'ServiceType', 'Category', 'Section', 'Product',
+                                        'Qty', 'TotalPrice', 'TotalCost', 'CostPct', 'TotalProfit',
+                                        'ProfitPct', 'IsAggregate'])
     if len(df) > 0:
-        df['Region'] = df['Branch'].map(get_region)
+        num_cols = ['Qty', 'TotalPrice', 'TotalCost', 'CostPct', 'TotalProfit', 'ProfitPct']
+        df[num_cols] = df[num_cols].apply(parse_number_series)
+
+        # Skip rows with all zeros and no meaningful product name
+        nonzero = df[['Qty', 'TotalPrice', 'TotalCost', 'TotalProfit']].to_numpy().any(axis=1)
+        df = df[nonzero | df['IsAggregate'].to_numpy()].reset_index(drop=True)
+
+        # Compute true revenue — critical data quality fix.
+        # The POS truncates TotalPrice at large values (overflow bug).
+        # For aggregate rows, TotalPrice is ALWAYS unreliable.
+        # TrueRevenue = TotalCost + TotalProfit is algebraically exact.
+        cost_plus_profit = df['TotalCost'] + df['TotalProfit']
+        true_revenue = np.where(df['IsAggregate'] | (df['TotalPrice'] <= 0), cost_plus_profit, df['TotalPrice'])
+        df.insert(df.columns.get_loc('IsAggregate'), 'TrueRevenue', true_revenue)
+
+        df.insert(df.columns.get_loc('Branch_Raw') + 1, 'Branch', normalize_branch_series(df['Branch_Raw']))
+        df['Region'] = get_region_series(df['Branch'])
+        # String-derived columns computed once here so analyzers don't rescan Product/Branch
+        df['Branch_Short'] = df['Branch'].str.removeprefix('Stories ')
+        df['IsTotal'] = df['Product'].str.startswith('Total')
+        # Product-family flags used by the margin-leak detectors
+        df['IsVeggie'] = df['Product'].str.contains('VEGGIE', case=False, regex=False, na=False)
+        df['IsSub'] = df['Product'].str.contains(SUB_RE, na=False)
+        df['IsCheesecake'] = df['Product'].str.contains(CHEESECAKE_RE, na=False)
+        df['IsAmioun'] = df['Branch'].str.contains('Amioun', case=False, regex=False, na=False)
         # Filter out aggregate rows for product-level analysis
         df['UnitProfit'] = np.where(df['Qty'] > 0, df['TotalProfit'] / df['Qty'], 0)
         df['UnitRevenue'] = np.where(df['Qty'] > 0, df['TrueRevenue'] / df['Qty'], 0)
         df['UnitCost'] = np.where(df['Qty'] > 0, df['TotalCost'] / df['Qty'], 0)
 
-    return df
+    return compact_dtypes(df)
 
 
 # ============================================================
@@ -397,8 +430,7 @@ def parse_sales_by_group(filepath):
     Returns DataFrame with columns:
     [Branch, Division, Group, Product, Barcode, Qty, TotalAmount, IsAggregate]
     """
-    with open(filepath, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+    lines = read_report_text(filepath).splitlines()
 
     records = []
     current_branch = None
@@ -406,12 +438,11 @@ def parse_sales_by_group(filepath):
     current_group = None
 
     for line in lines:
-        line = line.strip()
-        if not line:
+        if not line or line.isspace():
             continue
 
         # Skip page headers
-        if re.match(r'^\d{1,2}-\w{3}-\d{2}', line):
+        if PAGE_HEADER_RE.match(line):
             continue
         if line.startswith('Description,Barcode'):
             continue
@@ -420,7 +451,7 @@ def parse_sales_by_group(filepath):
         if 'Copyright' in line or 'omegapos' in line.lower():
             continue
 
-        parts = [p.strip() for p in csv_split(line)]
+        parts = csv_split(line)
         first = parts[0].strip()
 
         # Detect branch
@@ -456,30 +487,21 @@ def parse_sales_by_group(filepath):
 
         # Parse product rows
         if len(parts) >= 4:
-            barcode = parts[1] if len(parts) > 1 else ''
-            qty = parse_number(parts[2]) if len(parts) > 2 else 0.0
-            total_amount = parse_number(parts[3]) if len(parts) > 3 else 0.0
-
-            if qty == 0 and total_amount == 0 and not is_aggregate:
-                continue
-
-            records.append({
-                'Branch_Raw': current_branch,
-                'Branch': normalize_branch(current_branch) if current_branch else None,
-                'Division': current_division,
-                'Group': current_group,
-                'Product': first,
-                'Barcode': barcode,
-                'Qty': qty,
-                'TotalAmount': total_amount,
-                'IsAggregate': is_aggregate,
-                'AggLevel': agg_level,
-            })
-
-    df = pd.DataFrame(records)
+            records.append((
+                current_branch, current_division, current_group, first,
+                parts[1].strip(), parts[2], parts[3], is_aggregate, agg_level,
+            ))
+
+    df = pd.DataFrame(records, columns=['Branch_Raw', 'Division', 'Group', 'Product', 'Barcode',
+                                        'Qty', 'TotalAmount', 'IsAggregate', 'AggLevel'])
     if len(df) > 0:
-        df['Region'] = df['Branch'].map(get_region)
-    return df
+        df['Qty'] = parse_number_series(df['Qty'])
+        df['TotalAmount'] = parse_number_series(df['TotalAmount'])
+        nonzero = (df['Qty'].to_numpy() != 0) | (df['TotalAmount'].to_numpy() != 0)
+        df = df[nonzero | df['IsAggregate'].to_numpy()].reset_index(drop=True)
+        df.insert(df.columns.get_loc('Branch_Raw') + 1, 'Branch', normalize_branch_series(df['Branch_Raw']))
+        df['Region'] = get_region_series(df['Branch'])
+    return compact_dtypes(df)
 
 
 # ============================================================
@@ -492,20 +514,17 @@ def parse_category_summary(filepath):
     [Branch, Category, Qty, TotalPrice, TotalCost, CostPct,
      TotalProfit, ProfitPct, TrueRevenue, IsAggregate]
     """
-    with open(filepath, 'r', encoding='utf-8') as f:
-        lines = f.readlines()
+    lines = read_report_text(filepath).splitlines()
 
     records = []
     current_branch = None
-    known_branches = set(BRANCH_NAME_MAP.keys())
 
     for line in lines:
-        line = line.strip()
-        if not line:
+        if not line or line.isspace():
             continue
 
         # Skip headers
-        if re.match(r'^\d{1,2}-\w{3}-\d{2}', line):
+        if PAGE_HEADER_RE.match(line):
             continue
         if line.startswith('Category,Qty'):
             continue
@@ -514,11 +533,11 @@ def parse_category_summary(filepath):
         if 'Theoretical Profit' in line or 'Copyright' in line or 'omegapos' in line.lower():
             continue
 
-        parts = [p.strip() for p in csv_split(line)]
+        parts = csv_split(line)
         first = parts[0].strip()
 
         # Detect branch
-        if first in known_branches:
+        if first in KNOWN_BRANCHES:
             current_branch = first
             continue
 
@@ -527,35 +546,26 @@ def parse_category_summary(filepath):
 
         if first in ('BEVERAGES', 'FOOD') or is_aggregate:
             if len(parts) >= 8:
-                qty = parse_number(parts[1])
-                total_price = parse_number(parts[2])
-                total_cost = parse_number(parts[4])
-                cost_pct = parse_number(parts[5])
-                total_profit = parse_number(parts[6])
-                profit_pct = parse_number(parts[8]) if len(parts) > 8 else 0.0
-
-                true_revenue = total_cost + total_profit  # Always use this due to bug
-
-                records.append({
-                    'Branch_Raw': current_branch,
-                    'Branch': normalize_branch(current_branch) if current_branch else None,
-                    'Category': first if not is_aggregate else 'TOTAL',
-                    'Qty': qty,
-                    'TotalPrice': total_price,
-                    'TotalCost': total_cost,
-                    'CostPct': cost_pct,
-                    'TotalProfit': total_profit,
-                    'ProfitPct': profit_pct,
-                    'TrueRevenue': true_revenue,
-                    'IsAggregate': is_aggregate,
-                })
-
-    df = pd.DataFrame(records)
+                records.append((
+                    current_branch, first if not is_aggregate else 'TOTAL',
+                    parts[1], parts[2], parts[4], parts[5], parts[6],
+                    parts[8] if len(parts) > 8 else '',
+                    is_aggregate,
+                ))
+
+    df = pd.DataFrame(records, columns=['Branch_Raw', 'Category', 'Qty', 'TotalPrice', 'TotalCost',
+                                        'CostPct', 'TotalProfit', 'ProfitPct', 'IsAggregate'])
     if len(df) > 0:
-        df['Region'] = df['Branch'].map(get_region)
+        num_cols = ['Qty', 'TotalPrice', 'TotalCost', 'CostPct', 'TotalProfit', 'ProfitPct']
+        df[num_cols] = df[num_cols].apply(parse_number_series)
+        # Always use cost + profit due to the TotalPrice truncation bug
+        df.insert(df.columns.get_loc('IsAggregate'), 'TrueRevenue', df['TotalCost'] + df['TotalProfit'])
+        df.insert(df.columns.get_loc('Branch_Raw') + 1, 'Branch', normalize_branch_series(df['Branch_Raw']))
+        df['Region'] = get_region_series(df['Branch'])
+        df['Branch_Short'] = df['Branch'].str.removeprefix('Stories ')
         df['ProfitMargin'] = np.where(df['TrueRevenue'] > 0,
                                        df['TotalProfit'] / df['TrueRevenue'] * 100, 0)
-    return df
+    return compact_dtypes(df)
 
 
 # ============================================================
@@ -563,6 +573,12 @@ def parse_category_summary(filepath):
 # ============================================================
 def find_data_dir():
     """Find the Stories_data directory."""
+    # The candidates are mostly relative, so the lookup is cached per working directory
+    return _find_data_dir(os.getcwd())
+
+
+@functools.lru_cache(maxsize=8)
+def _find_data_dir(cwd):
     possible = [
         'Stories_data',
         'Archive/Stories_data',
@@ -575,10 +591,72 @@ def find_data_dir():
     raise FileNotFoundError("Cannot find Stories_data/ directory. Place CSV files in Stories_data/ folder.")
 
 
+# Raw report per dataset key: (file name, parser, label for the load summary)
+RAW_FILES = {
+    'monthly_sales': ('REP_S_00134_SMRY.csv', parse_monthly_sales, 'Monthly Sales'),
+    'product_profitability': ('rep_s_00014_SMRY.csv', parse_product_profitability, 'Product Profitability'),
+    'sales_by_group': ('rep_s_00191_SMRY-3.csv', parse_sales_by_group, 'Sales by Group'),
+    'category_summary': ('rep_s_00673_SMRY.csv', parse_category_summary, 'Category Summary'),
+}
+
+
+# Parquet cache settings: zstd-1 compresses these string-heavy tables well at
+# snappy-like speed; dictionary pages suit the repeated label columns.
+PARQUET_WRITE_OPTIONS = dict(engine='pyarrow', compression='zstd', compression_level=1,
+                             use_dictionary=True, row_group_size=64_000)
+
+# Bump when the cleaned tables change for reasons the hashed module source
+# can't see (e.g. a pandas/pyarrow upgrade); older caches are then re-parsed
+CLEANED_CACHE_VERSION = 1
+
+
+def _read_cached_parquet(path):
+    """
+    Read one cached table: memory-mapped, decoded on pyarrow's thread pool, and
+    handed to pandas column by column so Arrow buffers are released as they convert.
+    """
+    table = pq.read_table(path, memory_map=True, use_threads=True)
+    return table.to_pandas(self_destruct=True, split_blocks=True)
+
+
+def _file_fingerprint(path):
+    """(mtime_ns, size) of a raw report, or None if it is missing."""
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return [st.st_mtime_ns, st.st_size]
+
+
+@functools.lru_cache(maxsize=None)
+def _parser_version():
+    """Hash of this module's source and CLEANED_CACHE_VERSION (schema/parser changes invalidate the cache)."""
+    with open(__file__, 'rb') as f:
+        h = hashlib.blake2b(f.read(), digest_size=8)
+    h.update(str(CLEANED_CACHE_VERSION).encode())
+    return h.hexdigest()
+
+
+def _read_manifest(path):
+    """Raw-file fingerprints recorded with the parquet cache ({} if absent/unreadable)."""
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
 def load_all_data(data_dir=None, use_cache=True):
     """
     Load and clean all 4 data files.
 
+    The parquet cache records a (mtime, size) fingerprint of each raw CSV in
+    data/cleaned/manifest.json; only files whose fingerprint changed are
+    re-parsed.  The manifest also records the parser version, so a cache
+    written by different parsing code is rebuilt in full.  The four files are independent, so parquet reads, CSV parses
+    and parquet writes each run on a small thread pool (file I/O and pyarrow
+    release the GIL).
+
     Parameters:
         data_dir: Path to Stories_data/ folder. Auto-detected if None.
         use_cache: If True, use cached parquet files from data/cleaned/
@@ -588,52 +666,63 @@ def load_all_data(data_dir=None, use_cache=True):
                        'sales_by_group', 'category_summary'
     """
     cache_dir = os.path.join(os.path.dirname(__file__) or '.', 'data', 'cleaned')
+    cache_paths = {key: os.path.join(cache_dir, f'{key}.parquet') for key in RAW_FILES}
+    manifest_path = os.path.join(cache_dir, 'manifest.json')
 
+    if data_dir is None:
+        try:
+            data_dir = find_data_dir()
+        except FileNotFoundError:
+            if not (use_cache and os.path.isdir(cache_dir)):
+                raise
+            data_dir = None  # Cache-only install: trust the cache if its parser version matches
+
+    fingerprints = {'_parser': _parser_version()}
+    if data_dir is not None:
+        fingerprints.update((key, _file_fingerprint(os.path.join(data_dir, fname)))
+                            for key, (fname, _, _) in RAW_FILES.items())
+
+    data = {}
     if use_cache and os.path.isdir(cache_dir):
+        manifest = _read_manifest(manifest_path)
+        fresh = []
+        if manifest.get('_parser') == fingerprints['_parser']:
+            fresh = [key for key in RAW_FILES
+                     if data_dir is None or manifest.get(key) == fingerprints[key]]
         try:
-            data = {
-                'monthly_sales': pd.read_parquet(os.path.join(cache_dir, 'monthly_sales.parquet')),
-                'product_profitability': pd.read_parquet(os.path.join(cache_dir, 'product_profitability.parquet')),
-                'sales_by_group': pd.read_parquet(os.path.join(cache_dir, 'sales_by_group.parquet')),
-                'category_summary': pd.read_parquet(os.path.join(cache_dir, 'category_summary.parquet')),
-            }
+            with ThreadPoolExecutor(max_workers=len(RAW_FILES)) as pool:
+                data = dict(zip(fresh, pool.map(_read_cached_parquet, [cache_paths[k] for k in fresh])))
+        except Exception:
+            data = {}  # Fall through to re-parse
+        if len(data) == len(RAW_FILES):
             print("✅ Loaded cached data from data/cleaned/")
             return data
-        except Exception:
-            pass  # Fall through to re-parse
-
-    if data_dir is None:
-        data_dir = find_data_dir()
+        if data_dir is None:
+            data_dir = find_data_dir()  # Raises: cache incomplete and no raw files
 
+    stale = [key for key in RAW_FILES if key not in data]
     print(f"📂 Parsing raw CSV files from {data_dir}...")
 
-    # Parse all 4 files
-    monthly = parse_monthly_sales(os.path.join(data_dir, 'REP_S_00134_SMRY.csv'))
-    print(f"  ✅ Monthly Sales: {len(monthly)} rows ({monthly['Branch'].nunique()} branches)")
-
-    products = parse_product_profitability(os.path.join(data_dir, 'rep_s_00014_SMRY.csv'))
-    print(f"  ✅ Product Profitability: {len(products)} rows ({products['Branch'].nunique()} branches)")
-
-    groups = parse_sales_by_group(os.path.join(data_dir, 'rep_s_00191_SMRY-3.csv'))
-    print(f"  ✅ Sales by Group: {len(groups)} rows ({groups['Branch'].nunique()} branches)")
+    with ThreadPoolExecutor(max_workers=len(RAW_FILES)) as pool:
+        futures = {key: pool.submit(RAW_FILES[key][1], os.path.join(data_dir, RAW_FILES[key][0]))
+                   for key in stale}
+        data.update((key, future.result()) for key, future in futures.items())
 
-    categories = parse_category_summary(os.path.join(data_dir, 'rep_s_00673_SMRY.csv'))
-    print(f"  ✅ Category Summary: {len(categories)} rows ({categories['Branch'].nunique()} branches)")
+    for key in stale:
+        df = data[key]
+        print(f"  ✅ {RAW_FILES[key][2]}: {len(df)} rows ({df['Branch'].nunique()} branches)")
+    if len(stale) < len(RAW_FILES):
+        print(f"  ♻️  Reused cached: {', '.join(RAW_FILES[k][2] for k in RAW_FILES if k not in stale)}")
 
-    # Cache to parquet
+    # Cache the re-parsed tables to parquet, then record the fingerprints they were built from
     os.makedirs(cache_dir, exist_ok=True)
-    monthly.to_parquet(os.path.join(cache_dir, 'monthly_sales.parquet'), index=False)
-    products.to_parquet(os.path.join(cache_dir, 'product_profitability.parquet'), index=False)
-    groups.to_parquet(os.path.join(cache_dir, 'sales_by_group.parquet'), index=False)
-    categories.to_parquet(os.path.join(cache_dir, 'category_summary.parquet'), index=False)
+    with ThreadPoolExecutor(max_workers=len(RAW_FILES)) as pool:
+        list(pool.map(lambda key: data[key].to_parquet(cache_paths[key], index=False, **PARQUET_WRITE_OPTIONS), stale))
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(fingerprints, f, indent=2)
     print(f"\n💾 Cached cleaned data to {cache_dir}/")
 
-    return {
-        'monthly_sales': monthly,
-        'product_profitability': products,
-        'sales_by_group': groups,
-        'category_summary': categories,
-    }
+    return {key: data[key] for key in RAW_FILES}
 
 
 def load_uploaded_data(files_dict):
@@ -647,7 +736,6 @@ def load_uploaded_data(files_dict):
             'sales_by_group' -> uploaded file
             'category_summary' -> uploaded file
     """
-    import tempfile
     results = {}
 
     parsers = {
@@ -660,18 +748,7 @@ def load_uploaded_data(files_dict):
     for key, (pattern, parser) in parsers.items():
         for fname, fobj in files_dict.items():
             if pattern.lower() in fname.lower():
-                # Write to temp file and parse
-                with tempfile.NamedTemporaryFile(mode='w', suffix='.csv', delete=False,
-                                                  encoding='utf-8') as tmp:
-                    content = fobj.read()
-                    if isinstance(content, bytes):
-                        content = content.decode('utf-8')
-                    tmp.write(content)
-                    tmp_path = tmp.name
-                try:
-                    results[key] = parser(tmp_path)
-                finally:
-                    os.unlink(tmp_path)
+                results[key] = parser(fobj)
                 break
 
     return results
@@ -683,22 +760,29 @@ def validate_data(data):
     print("DATA VALIDATION REPORT")
     print("="*60)
 
+    branch_sets = {}
     for name, df in data.items():
         print(f"\n📊 {name}")
         print(f"   Rows: {len(df)}")
         print(f"   Columns: {list(df.columns)}")
         if 'Branch' in df.columns:
-            branches = df['Branch'].nunique()
-            print(f"   Unique Branches: {branches}")
-            if branches < 25:
-                missing = set(BRANCH_NAME_MAP.values()) - set(df['Branch'].unique())
+            # One distinct-value pass, reused for the count, gap check and cross-check
+            branches = branch_sets[name] = set(df['Branch'].dropna().unique())
+            print(f"   Unique Branches: {len(branches)}")
+            if len(branches) < 25:
+                missing = set(BRANCH_NAME_MAP.values()) - branches
                 print(f"   ⚠️  Missing branches: {missing}")
-        print(f"   Null counts:\n{df.isnull().sum().to_string()}")
+        nulls = df.isna().sum()
+        nulls = nulls[nulls > 0]
+        if len(nulls):
+            print(f"   Null counts:\n{nulls.to_string()}")
+        else:
+            print("   Null counts: none")
 
     # Cross-validation
-    if 'monthly_sales' in data and 'category_summary' in data:
-        ms_branches = set(data['monthly_sales']['Branch'].unique())
-        cs_branches = set(data['category_summary']['Branch'].unique())
+    if 'monthly_sales' in branch_sets and 'category_summary' in branch_sets:
+        ms_branches = branch_sets['monthly_sales']
+        cs_branches = branch_sets['category_summary']
         if ms_branches == cs_branches:
             print("\n✅ Branch lists match across File 1 and File 4")
         else:
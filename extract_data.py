@@ -3,6 +3,9 @@ import sys, json
 sys.path.insert(0, '.')
 
 from data_cleaning import load_all_data, BRANCH_NAME_MAP, REGION_MAP
+from analysis.preprocessing import enable_copy_on_write, get_year_rows
+
+enable_copy_on_write()
 
 data = load_all_data()
 monthly_df = data['monthly_sales']
@@ -18,17 +21,11 @@ from analysis.branch_analysis import top_bottom_branches, chain_kpis
 top, bottom = top_bottom_branches(monthly_df)
 
 print("=== TOP 5 BRANCHES ===")
-for _, r in top.iterrows():
-    b = r['Branch']
-    v = r['Total_By_Year']
-    reg = r['Region']
+for b, v, reg in top[['Branch', 'Total_By_Year', 'Region']].itertuples(index=False, name=None):
     print(f"  {b} | {v:,.0f} | {reg}")
 
 print("\n=== BOTTOM 5 BRANCHES ===")
-for _, r in bottom.iterrows():
-    b = r['Branch']
-    v = r['Total_By_Year']
-    reg = r['Region']
+for b, v, reg in bottom[['Branch', 'Total_By_Year', 'Region']].itertuples(index=False, name=None):
     print(f"  {b} | {v:,.0f} | {reg}")
 
 # ===== 2. CHAIN KPIs =====
@@ -38,31 +35,28 @@ for k, v in kpis.items():
     print(f"  {k}: {v}")
 
 # ===== 3. MONTHLY REVENUE 2025 (chain-wide) =====
-df_2025 = monthly_df[monthly_df['Year'] == 2025]
-chain_monthly = df_2025[months].sum()
+df_2025 = get_year_rows(monthly_df, 2025)
+year_totals = (monthly_df.groupby('Year')[months + ['Total_By_Year']].sum()
+               .reindex([2025, 2026], fill_value=0))
+chain_monthly = year_totals.loc[2025, months]
 print("\n=== MONTHLY REVENUE 2025 (chain-wide) ===")
 for m in months:
     print(f"  {m}: {chain_monthly[m]:,.0f}")
 
-df_2026 = monthly_df[monthly_df['Year'] == 2026]
-jan_2026_total = df_2026['January'].sum()
+jan_2026_total = year_totals.loc[2026, 'January']
 print(f"  January 2026: {jan_2026_total:,.0f}")
 
 # ===== 4. ALL BRANCHES with 2025 revenue =====
 print("\n=== ALL BRANCHES 2025 REVENUE ===")
-all_branches = df_2025.sort_values('Total_By_Year', ascending=False)
-for _, r in all_branches.iterrows():
-    b = r['Branch']
-    v = r['Total_By_Year']
-    reg = r['Region']
+all_branches = df_2025.sort_values('Total_By_Year', ascending=False, kind='stable')
+for b, v, reg in all_branches[['Branch', 'Total_By_Year', 'Region']].itertuples(index=False, name=None):
     print(f"  {b} | {v:,.0f} | {reg}")
 
 # ===== 5. MONTHLY DATA PER BRANCH (for heatmap) =====
 print("\n=== BRANCH MONTHLY DATA 2025 ===")
-for _, r in df_2025.iterrows():
-    branch = r['Branch']
-    vals = [str(r[m]) for m in months]
-    print(f"  {branch} | {' | '.join(vals)}")
+if len(df_2025) > 0:
+    heatmap_rows = df_2025[['Branch'] + months].astype(str).agg(' | '.join, axis=1)
+    print('\n'.join('  ' + line for line in heatmap_rows))
 
 # ===== 6. MARGIN LEAKS =====
 from analysis.margin_leaks import (
@@ -73,8 +67,8 @@ from analysis.margin_leaks import (
 
 leak_df, total_leaks = generate_margin_leak_report(product_df)
 print(f"\n=== MARGIN LEAKS (Total: {total_leaks:,.0f}) ===")
-for _, r in leak_df.iterrows():
-    print(f"  {r['Leak']}: {r['Annual_Loss']:,.0f} | {r['Priority']} | {r['Description']}")
+for r in leak_df.itertuples(index=False):
+    print(f"  {r.Leak}: {r.Annual_Loss:,.0f} | {r.Priority} | {r.Description}")
 
 _, veggie_stats = veggie_sub_analysis(product_df)
 print(f"\n=== VEGGIE SUB STATS ===")
@@ -108,57 +102,53 @@ print(f"  Total products classified: {len(chain_df)}")
 print(f"  Median Qty threshold: {med_qty:,.0f}")
 print(f"  Median Margin threshold: {med_margin:.1f}%")
 
+quad_counts = chain_df['Quadrant'].value_counts()
+top10_all = (chain_df.sort_values('Total_Profit', ascending=False, kind='stable')
+             .groupby('Quadrant', observed=True).head(10))
+top10_by_quad = dict(list(top10_all.groupby('Quadrant', observed=True, sort=False)))
 for q in ['⭐ Star', '🐴 Plowhorse', '🧩 Puzzle', '🐕 Dog']:
-    subset = chain_df[chain_df['Quadrant'] == q]
-    print(f"\n  {q}: {len(subset)} products")
-    top10 = subset.sort_values('Total_Profit', ascending=False).head(10)
-    for _, r in top10.iterrows():
-        print(f"    {r['Product']} | Qty:{r['Total_Qty']:,.0f} | Rev:{r['Total_Revenue']:,.0f} | Margin:{r['Margin_Pct']:.1f}% | Profit:{r['Total_Profit']:,.0f}")
+    print(f"\n  {q}: {quad_counts.get(q, 0)} products")
+    top10 = top10_by_quad.get(q, top10_all.iloc[:0])
+    for r in top10.itertuples(index=False):
+        print(f"    {r.Product} | Qty:{r.Total_Qty:,.0f} | Rev:{r.Total_Revenue:,.0f} | Margin:{r.Margin_Pct:.1f}% | Profit:{r.Total_Profit:,.0f}")
 
 # Modifier attach rates
 stats_df, top_rate, opportunity = modifier_attachment_analysis(product_df)
 print(f"\n=== MODIFIER ATTACHMENT RATES ===")
 print(f"  Top rate: {top_rate:.1f}%")
 print(f"  Opportunity: {opportunity:,.0f}")
-for _, r in stats_df.iterrows():
-    branch = r['Branch_Short']
-    rate = r['Attach_Rate_Pct']
-    mod_qty = r['Modifier_Qty']
-    base_qty = r['Base_Beverage_Qty']
-    profit = r['Modifier_Profit']
+stats_cols = ['Branch_Short', 'Attach_Rate_Pct', 'Modifier_Qty', 'Base_Beverage_Qty', 'Modifier_Profit']
+for branch, rate, mod_qty, base_qty, profit in stats_df[stats_cols].itertuples(index=False, name=None):
     print(f"  {branch} | Rate:{rate:.1f}% | ModQty:{mod_qty:,.0f} | BaseQty:{base_qty:,.0f} | Profit:{profit:,.0f}")
 
 # Top/bottom products
 print("\n=== TOP 20 PRODUCTS BY PROFIT ===")
 top_prods = top_products_by_profit(product_df, 20)
-for _, r in top_prods.iterrows():
-    print(f"  {r['Product']} | {r['Category']} | Qty:{r['Total_Qty']:,.0f} | Profit:{r['Total_Profit']:,.0f} | Rev:{r['Total_Revenue']:,.0f} | Margin:{r['Avg_Margin']:.1f}%")
+for r in top_prods.itertuples(index=False):
+    print(f"  {r.Product} | {r.Category} | Qty:{r.Total_Qty:,.0f} | Profit:{r.Total_Profit:,.0f} | Rev:{r.Total_Revenue:,.0f} | Margin:{r.Avg_Margin:.1f}%")
 
 print("\n=== BOTTOM 20 PRODUCTS BY PROFIT ===")
 bot_prods = bottom_products_by_profit(product_df, 20)
-for _, r in bot_prods.iterrows():
-    print(f"  {r['Product']} | {r['Category']} | Qty:{r['Total_Qty']:,.0f} | Profit:{r['Total_Profit']:,.0f} | Rev:{r['Total_Revenue']:,.0f} | Margin:{r['Avg_Margin']:.1f}%")
+for r in bot_prods.itertuples(index=False):
+    print(f"  {r.Product} | {r.Category} | Qty:{r.Total_Qty:,.0f} | Profit:{r.Total_Profit:,.0f} | Rev:{r.Total_Revenue:,.0f} | Margin:{r.Avg_Margin:.1f}%")
 
 # ===== 8. FORECASTING =====
-from models.forecasting import forecast_all_branches, compute_2026_projections
-forecasts = forecast_all_branches(monthly_df)
+from models.forecasting import forecast_all_branches, compute_2026_projections, FORECAST_CACHE_DIR
+forecasts = forecast_all_branches(monthly_df, cache_dir=FORECAST_CACHE_DIR)
 projections = compute_2026_projections(monthly_df, forecasts)
 
 print(f"\n=== 2026 PROJECTIONS ===")
-chain_2025 = df_2025['Total_By_Year'].sum()
+chain_2025 = year_totals.loc[2025, 'Total_By_Year']
 chain_2026 = projections['Projected_2026_Total'].sum()
 print(f"  Chain 2025 Total: {chain_2025:,.0f}")
 print(f"  Chain 2026 Projected: {chain_2026:,.0f}")
 print(f"  YoY Growth: {(chain_2026 - chain_2025) / chain_2025 * 100:+.1f}%")
 
 print("\n=== BRANCH 2026 PROJECTIONS ===")
-for _, r in projections.sort_values('Projected_2026_Total', ascending=False).iterrows():
-    b = r['Branch']
-    t25 = r['Actual_2025_Total']
-    j26 = r['Jan_2026_Actual']
-    fc = r['Feb_Dec_Forecast']
-    t26 = r['Projected_2026_Total']
-    g = r['YoY_Growth_Pct']
+proj_cols = ['Branch', 'Actual_2025_Total', 'Jan_2026_Actual', 'Feb_Dec_Forecast',
+             'Projected_2026_Total', 'YoY_Growth_Pct']
+proj_sorted = projections.sort_values('Projected_2026_Total', ascending=False)
+for b, t25, j26, fc, t26, g in proj_sorted[proj_cols].itertuples(index=False, name=None):
     print(f"  {b} | 2025:{t25:,.0f} | Jan26:{j26:,.0f} | Forecast:{fc:,.0f} | Total26:{t26:,.0f} | Growth:{g:+.1f}%")
 
 # Monthly forecast values per branch (chain-wide aggregated)
@@ -188,24 +178,21 @@ for cluster_name in sorted(clustered['Cluster'].unique()):
     print(f"  Avg Revenue: {avg_rev:,.0f} | Avg Growth: {avg_growth:+.1f}% | Avg Margin: {avg_margin:.1f}%")
 
 print(f"\n=== CLUSTER FEATURE DETAILS ===")
-for _, r in clustered.iterrows():
-    print(f"  {r['Branch']} | Cluster:{r['Cluster']} | Rev:{r['Total_Revenue']:,.0f} | Growth:{r['Growth_Pct']:+.1f}% | Margin:{r['Profit_Margin_Pct']:.1f}% | BevShare:{r['Beverage_Share_Pct']:.1f}% | SeasonCV:{r['Seasonality_CV']:.3f} | RevPerMonth:{r['Revenue_Per_Month']:,.0f} | ActiveMonths:{r['Active_Months']}")
+cluster_cols = ['Branch', 'Cluster', 'Total_Revenue', 'Growth_Pct', 'Profit_Margin_Pct',
+                'Beverage_Share_Pct', 'Seasonality_CV', 'Revenue_Per_Month', 'Active_Months']
+for r in clustered[cluster_cols].itertuples(index=False, name='C'):
+    print(f"  {r.Branch} | Cluster:{r.Cluster} | Rev:{r.Total_Revenue:,.0f} | Growth:{r.Growth_Pct:+.1f}% | Margin:{r.Profit_Margin_Pct:.1f}% | BevShare:{r.Beverage_Share_Pct:.1f}% | SeasonCV:{r.Seasonality_CV:.3f} | RevPerMonth:{r.Revenue_Per_Month:,.0f} | ActiveMonths:{r.Active_Months}")
 
 # ===== 10. RADAR CHART DATA =====
-import numpy as np
 metrics = ['Total_Revenue', 'Growth_Pct', 'Profit_Margin_Pct',
            'Beverage_Share_Pct', 'Seasonality_CV', 'Revenue_Per_Month']
 labels = ['Revenue', 'Growth', 'Margin', 'Beverage Mix', 'Seasonality', 'Efficiency']
 
 print(f"\n=== RADAR CHART DATA (normalized 0-1) ===")
-for cluster in clustered['Cluster'].unique():
-    cl_data = clustered[clustered['Cluster'] == cluster]
-    values = []
-    for m in metrics:
-        col_min = clustered[m].min()
-        col_max = clustered[m].max()
-        col_range = col_max - col_min if col_max != col_min else 1
-        values.append((cl_data[m].mean() - col_min) / col_range)
+col_min = clustered[metrics].min()
+col_range = (clustered[metrics].max() - col_min).replace(0, 1)
+radar = (clustered.groupby('Cluster', sort=False)[metrics].mean() - col_min) / col_range
+for cluster, *values in radar.itertuples(name=None):
     vals_str = ' | '.join([f"{l}:{v:.3f}" for l, v in zip(labels, values)])
     print(f"  {cluster}: {vals_str}")
 
@@ -218,9 +205,9 @@ for canonical in sorted(set(BRANCH_NAME_MAP.values())):
 # ===== 12. CATEGORY MIX PER BRANCH =====
 print(f"\n=== CATEGORY MIX PER BRANCH ===")
 cat_clean = category_df[~category_df['IsAggregate']]
-for branch in sorted(cat_clean['Branch'].unique()):
-    bdata = cat_clean[cat_clean['Branch'] == branch]
-    for _, r in bdata.iterrows():
-        print(f"  {branch} | {r['Category']} | Rev:{r['TrueRevenue']:,.0f} | Profit:{r['TotalProfit']:,.0f} | Margin:{r['ProfitMargin']:.1f}%")
+# Branch is categorical with sorted categories, so this walks branches alphabetically
+for branch, bdata in cat_clean.groupby('Branch', observed=True):
+    for r in bdata.itertuples(index=False):
+        print(f"  {branch} | {r.Category} | Rev:{r.TrueRevenue:,.0f} | Profit:{r.TotalProfit:,.0f} | Margin:{r.ProfitMargin:.1f}%")
 
 print("\n=== EXTRACTION COMPLETE ===")
@@ -10,12 +10,21 @@ matplotlib.use('Agg')
 import matplotlib.pyplot as plt
 import matplotlib.ticker as mticker
 from matplotlib.patches import FancyBboxPatch
-import os, sys
+from matplotlib.lines import Line2D
+import os, sys, json, hashlib, importlib, inspect
 
 # ── Setup ────────────────────────────────────────────────────────────────────
 sys.path.insert(0, os.path.dirname(__file__))
 OUT = os.path.join(os.path.dirname(__file__), 'figures')
 os.makedirs(OUT, exist_ok=True)
+# Vector PDF only by default; pass --png to also rasterize 300-dpi previews
+FORMATS = ('pdf', 'png') if '--png' in sys.argv[1:] else ('pdf',)
+# Figures whose inputs and code are unchanged are skipped; --force redraws all
+FORCE = '--force' in sys.argv[1:]
+MANIFEST = os.path.join(OUT, '.manifest.json')
+# Bump to redraw everything after changes the figure keys can't see
+# (e.g. a matplotlib or scikit-learn upgrade)
+FIGURE_CACHE_VERSION = 1
 
 # Brand colours (coffee palette)
 BROWN   = '#654321'
@@ -45,12 +54,25 @@ plt.rcParams.update({
     'grid.color': '#DDDDDD',
 })
 
+
+def save(fig, name):
+    """Write fig to figures/<name>.<fmt> for each of FORMATS, then close it."""
+    for fmt in FORMATS:
+        fig.savefig(os.path.join(OUT, f'{name}.{fmt}'), bbox_inches='tight', dpi=300)
+    plt.close(fig)
+    print(f"✓ {name}.pdf")
+
+
 # ── Load data ────────────────────────────────────────────────────────────────
-DATA = os.path.join(os.path.dirname(__file__), 'data', 'cleaned')
-monthly_df   = pd.read_parquet(os.path.join(DATA, 'monthly_sales.parquet'))
-product_df   = pd.read_parquet(os.path.join(DATA, 'product_profitability.parquet'))
-category_df  = pd.read_parquet(os.path.join(DATA, 'category_summary.parquet'))
-group_df     = pd.read_parquet(os.path.join(DATA, 'sales_by_group.parquet'))
+# Same parquet cache as extract_data.py: reused when fresh, rebuilt from the raw CSVs otherwise
+from data_cleaning import load_all_data
+from analysis.preprocessing import enable_copy_on_write
+enable_copy_on_write()
+data = load_all_data()
+monthly_df   = data['monthly_sales']
+product_df   = data['product_profitability']
+category_df  = data['category_summary']
+group_df     = data['sales_by_group']
 
 print(f"Data loaded: monthly={len(monthly_df)}, products={len(product_df)}, "
       f"categories={len(category_df)}, groups={len(group_df)}")
@@ -68,22 +90,18 @@ def fig_margin_waterfall():
         ('Amioun POS\nError', 49_000),
     ]
     labels = [l for l, _ in leaks]
-    values = [v for _, v in leaks]
-    total  = sum(values)
+    values = np.array([v for _, v in leaks], dtype=np.float64)
+    total  = values.sum()
+    bottoms = np.concatenate([[0.0], np.cumsum(values)[:-1]])
 
     fig, ax = plt.subplots(figsize=(5.5, 2.8))
 
-    cumulative = 0
-    bars = []
-    for i, (label, val) in enumerate(leaks):
-        bar = ax.bar(i, val / 1e6, bottom=cumulative / 1e6,
-                     color=RED, alpha=0.75, width=0.6, edgecolor='white', linewidth=0.5)
-        # Value label
-        mid = (cumulative + val / 2) / 1e6
+    # Stacked leak bars in one call, each starting where the previous one ends
+    ax.bar(np.arange(len(values)), values / 1e6, bottom=bottoms / 1e6,
+           color=RED, alpha=0.75, width=0.6, edgecolor='white', linewidth=0.5)
+    for i, (mid, val) in enumerate(zip((bottoms + values / 2) / 1e6, values)):
         ax.text(i, mid, f'{val/1e6:.1f}M', ha='center', va='center',
                 fontsize=7, fontweight='bold', color='white')
-        cumulative += val
-        bars.append(bar)
 
     # Total bar
     ax.bar(len(leaks), total / 1e6, color=BROWN, alpha=0.9, width=0.6,
@@ -99,10 +117,7 @@ def fig_margin_waterfall():
     ax.spines['right'].set_visible(False)
     ax.yaxis.set_major_formatter(mticker.FormatStrFormatter('%.0fM'))
     plt.tight_layout()
-    fig.savefig(os.path.join(OUT, 'waterfall.pdf'), bbox_inches='tight', dpi=300)
-    fig.savefig(os.path.join(OUT, 'waterfall.png'), bbox_inches='tight', dpi=300)
-    plt.close(fig)
-    print("✓ waterfall.pdf")
+    save(fig, 'waterfall')
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -133,13 +148,21 @@ def fig_menu_matrix():
     ax.axhspan(med_margin, ymax, xmin=0, xmax=1, color=GREEN,  alpha=0.04, transform=ax.get_yaxis_transform(), zorder=0)
     ax.axhspan(ymin, med_margin, xmin=0, xmax=1, color=RED,    alpha=0.04, transform=ax.get_yaxis_transform(), zorder=0)
 
-    # Plot each quadrant
-    for quad, (desc, color, short_label) in quad_info.items():
-        subset = plot_df[plot_df['Quadrant'] == quad]
-        sizes = np.clip(subset['Total_Revenue'] / plot_df['Total_Revenue'].max() * 150, 10, 150)
-        ax.scatter(subset['Total_Qty'], subset['Margin_Pct'],
-                   s=sizes, c=color, alpha=0.55, edgecolors='white', linewidth=0.3,
-                   label=f"{short_label} ({len(subset)})", zorder=3)
+    # All quadrants in one scatter, stacked in quad_info order as separate calls would be
+    sizes = np.clip(plot_df['Total_Revenue'] / plot_df['Total_Revenue'].max() * 150, 10, 150)
+    quad_order = pd.Categorical(plot_df['Quadrant'], categories=list(quad_info)).codes
+    pts = np.flatnonzero(quad_order >= 0)
+    pts = pts[np.argsort(quad_order[pts], kind='stable')]
+    quad_colors = np.array([color for _, color, _ in quad_info.values()])
+    ax.scatter(plot_df['Total_Qty'].to_numpy()[pts], plot_df['Margin_Pct'].to_numpy()[pts],
+               s=sizes.to_numpy()[pts], c=quad_colors[quad_order[pts]],
+               alpha=0.55, edgecolors='white', linewidth=0.3, zorder=3)
+    quad_counts = np.bincount(quad_order[pts], minlength=len(quad_info))
+    legend_handles = [
+        Line2D([], [], ls='', marker='o', ms=5, color=color, alpha=0.55, markeredgecolor='white',
+               label=f"{short_label} ({n})")
+        for (_, color, short_label), n in zip(quad_info.values(), quad_counts)
+    ]
 
     # Median lines
     ax.axhline(med_margin, color=DARK, ls='--', lw=1, alpha=0.4, zorder=2)
@@ -165,48 +188,40 @@ def fig_menu_matrix():
     ax.set_xlabel('Quantity Sold (log scale)', fontsize=8)
     ax.set_ylabel('Profit Margin %', fontsize=8)
     ax.set_title('Menu Engineering Matrix — 409 Products Classified', fontsize=10, fontweight='bold', color=DARK)
-    ax.legend(fontsize=6.5, loc='lower left', framealpha=0.9, edgecolor='#ddd')
+    ax.legend(handles=legend_handles, fontsize=6.5, loc='lower left', framealpha=0.9, edgecolor='#ddd')
     ax.spines['top'].set_visible(False)
     ax.spines['right'].set_visible(False)
     plt.tight_layout()
-    fig.savefig(os.path.join(OUT, 'menu_matrix.pdf'), bbox_inches='tight', dpi=300)
-    fig.savefig(os.path.join(OUT, 'menu_matrix.png'), bbox_inches='tight', dpi=300)
-    plt.close(fig)
-    print("✓ menu_matrix.pdf")
+    save(fig, 'menu_matrix')
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # FIGURE 3 — Seasonality + Forecasting combined
 # ═══════════════════════════════════════════════════════════════════════════════
 def fig_seasonality_forecast():
-    from models.forecasting import prepare_time_series, forecast_branch_xgboost
+    from models.forecasting import forecast_all_branches, FORECAST_CACHE_DIR
+    from analysis.preprocessing import get_year_rows
 
     months = ['January','February','March','April','May','June',
               'July','August','September','October','November','December']
     month_short = ['Jan','Feb','Mar','Apr','May','Jun','Jul','Aug','Sep','Oct','Nov','Dec']
 
     # 2025 actuals — chain-wide
-    df_2025 = monthly_df[monthly_df['Year'] == 2025]
+    df_2025 = get_year_rows(monthly_df, 2025)
     chain_2025 = df_2025[months].sum().values  # 12 monthly values
 
     # Jan 2026 actual
-    df_2026 = monthly_df[monthly_df['Year'] == 2026]
+    df_2026 = get_year_rows(monthly_df, 2026)
     jan_2026_actual = df_2026['January'].sum() if len(df_2026) > 0 else 0
 
-    # Forecast per branch, then sum
-    branches = monthly_df['Branch'].unique()
-    forecast_sums = np.zeros(11)  # Feb-Dec 2026
-    forecast_lower = np.zeros(11)
-    forecast_upper = np.zeros(11)
-    count = 0
-
-    for branch in branches:
-        result = forecast_branch_xgboost(monthly_df, branch, forecast_months=11)
-        if result is not None:
-            forecast_sums += result['yhat'].values
-            forecast_lower += result['yhat_lower'].values
-            forecast_upper += result['yhat_upper'].values
-            count += 1
+    # Forecast per branch (sequential fits, cached on disk), then sum Feb-Dec 2026 across branches
+    forecasts = forecast_all_branches(monthly_df, cache_dir=FORECAST_CACHE_DIR)
+    fc_cols = ['yhat', 'yhat_lower', 'yhat_upper']
+    if len(forecasts) > 0:
+        chain_fc = forecasts.groupby('Month')[fc_cols].sum().reindex(range(2, 13), fill_value=0)
+    else:
+        chain_fc = pd.DataFrame(0.0, index=range(2, 13), columns=fc_cols)
+    forecast_sums, forecast_lower, forecast_upper = chain_fc.to_numpy().T
 
     # Build full time series for plotting
     x_actual = list(range(12))  # Jan-Dec 2025
@@ -259,10 +274,7 @@ def fig_seasonality_forecast():
     ax.spines['top'].set_visible(False)
     ax.spines['right'].set_visible(False)
     plt.tight_layout()
-    fig.savefig(os.path.join(OUT, 'forecast.pdf'), bbox_inches='tight', dpi=300)
-    fig.savefig(os.path.join(OUT, 'forecast.png'), bbox_inches='tight', dpi=300)
-    plt.close(fig)
-    print("✓ forecast.pdf")
+    save(fig, 'forecast')
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -272,37 +284,42 @@ def fig_clustering():
     from models.clustering import build_branch_features, cluster_branches
     features_df = build_branch_features(monthly_df, category_df, product_df)
     cluster_df, kmeans, scaler = cluster_branches(features_df, n_clusters=4)
+    cluster_df['Branch_Short'] = cluster_df['Branch'].str.replace('Stories ', '', regex=False)
+    max_qty = cluster_df['Total_Qty'].max()
 
     quad_colors_list = [BROWN, BLUE, GREEN, ORANGE]
 
     fig, ax = plt.subplots(figsize=(5.5, 3.0))
 
+    # One scatter for all branches, drawn cluster by cluster in sorted order
     clusters = sorted(cluster_df['Cluster'].unique())
-    for i, cname in enumerate(clusters):
-        subset = cluster_df[cluster_df['Cluster'] == cname]
-        c = quad_colors_list[i % len(quad_colors_list)]
-        sizes = np.clip(subset['Total_Qty'] / cluster_df['Total_Qty'].max() * 150, 20, 150)
-        ax.scatter(subset['Revenue_Per_Month'], subset['Profit_Margin_Pct'],
-                   s=sizes, c=c, alpha=0.7, edgecolors='white', linewidth=0.5,
-                   label=f"{cname} ({len(subset)})")
-        # Label each branch
-        for _, row in subset.iterrows():
-            ax.annotate(row['Branch'].replace('Stories ', ''),
-                        (row['Revenue_Per_Month'], row['Profit_Margin_Pct']),
-                        fontsize=4.5, ha='center', va='bottom', color=MUTED)
+    codes = pd.Categorical(cluster_df['Cluster'], categories=clusters).codes
+    plot_df = cluster_df.iloc[np.argsort(codes, kind='stable')]
+    codes = np.sort(codes, kind='stable')
+    colors = np.array(quad_colors_list)[codes % len(quad_colors_list)]
+    sizes = np.clip(plot_df['Total_Qty'] / max_qty * 150, 20, 150)
+    ax.scatter(plot_df['Revenue_Per_Month'], plot_df['Profit_Margin_Pct'],
+               s=sizes, c=colors, alpha=0.7, edgecolors='white', linewidth=0.5)
+    counts = np.bincount(codes, minlength=len(clusters))
+    legend_handles = [
+        Line2D([], [], ls='', marker='o', ms=6, color=quad_colors_list[i % len(quad_colors_list)],
+               alpha=0.7, markeredgecolor='white', label=f"{cname} ({n})")
+        for i, (cname, n) in enumerate(zip(clusters, counts))
+    ]
+    # Label each branch
+    for label, x, y in plot_df[['Branch_Short', 'Revenue_Per_Month', 'Profit_Margin_Pct']].itertuples(index=False, name=None):
+        ax.annotate(label, (x, y),
+                    fontsize=4.5, ha='center', va='bottom', color=MUTED)
 
     ax.set_xlabel('Revenue per Active Month', fontsize=8)
     ax.set_ylabel('Profit Margin %', fontsize=8)
     ax.set_title('Branch Clustering — 4 Strategic Segments', fontsize=10, fontweight='bold', color=DARK)
-    ax.legend(fontsize=6, loc='best', framealpha=0.8)
+    ax.legend(handles=legend_handles, fontsize=6, loc='best', framealpha=0.8)
     ax.xaxis.set_major_formatter(mticker.FuncFormatter(lambda x, _: f'{x/1e6:.0f}M'))
     ax.spines['top'].set_visible(False)
     ax.spines['right'].set_visible(False)
     plt.tight_layout()
-    fig.savefig(os.path.join(OUT, 'clustering.pdf'), bbox_inches='tight', dpi=300)
-    fig.savefig(os.path.join(OUT, 'clustering.png'), bbox_inches='tight', dpi=300)
-    plt.close(fig)
-    print("✓ clustering.pdf")
+    save(fig, 'clustering')
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
@@ -338,21 +355,66 @@ def fig_modifier_rates():
     ax.spines['top'].set_visible(False)
     ax.spines['right'].set_visible(False)
     plt.tight_layout()
-    fig.savefig(os.path.join(OUT, 'modifiers.pdf'), bbox_inches='tight', dpi=300)
-    fig.savefig(os.path.join(OUT, 'modifiers.png'), bbox_inches='tight', dpi=300)
-    plt.close(fig)
-    print("✓ modifiers.pdf")
+    save(fig, 'modifiers')
 
 
 # ═══════════════════════════════════════════════════════════════════════════════
 # Main
 # ═══════════════════════════════════════════════════════════════════════════════
+_frame_digests = {}
+
+
+def figure_key(fn, inputs, helpers):
+    """
+    Hash of everything a figure depends on: its function's source, the source
+    of the helper modules it calls, the shared style (palette, rcParams, save),
+    its input frames, FORMATS and FIGURE_CACHE_VERSION.
+    """
+    h = hashlib.blake2b(inspect.getsource(fn).encode(), digest_size=8)
+    for module in helpers:
+        h.update(inspect.getsource(importlib.import_module(module)).encode())
+    h.update(repr([BROWN, ACCENT, CREAM, DARK, MUTED, RED, GREEN, BLUE, PURPLE, ORANGE]).encode())
+    h.update(repr(sorted(plt.rcParams.items())).encode())
+    h.update(inspect.getsource(save).encode())
+    h.update(str(FIGURE_CACHE_VERSION).encode())
+    for df in inputs:
+        if id(df) not in _frame_digests:
+            _frame_digests[id(df)] = pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes()
+        h.update(_frame_digests[id(df)])
+    h.update(repr(FORMATS).encode())
+    return h.hexdigest()
+
+
 if __name__ == '__main__':
     print("Generating figures for executive summary...")
-    fig_margin_waterfall()
-    fig_menu_matrix()
-    fig_seasonality_forecast()
-    fig_clustering()
-    fig_modifier_rates()
+    # (name, function, input frames, modules whose code the figure calls)
+    figures = [
+        ('waterfall',   fig_margin_waterfall,     (), ()),
+        ('menu_matrix', fig_menu_matrix,          (product_df,),
+         ('analysis.menu_engineering', 'analysis.preprocessing')),
+        ('forecast',    fig_seasonality_forecast, (monthly_df,),
+         ('models.forecasting', 'analysis.preprocessing')),
+        ('clustering',  fig_clustering,           (monthly_df, category_df, product_df),
+         ('models.clustering', 'analysis.preprocessing')),
+        ('modifiers',   fig_modifier_rates,       (product_df,),
+         ('analysis.menu_engineering', 'analysis.preprocessing')),
+    ]
+    try:
+        with open(MANIFEST, encoding='utf-8') as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        manifest = {}
+
+    for name, fn, inputs, helpers in figures:
+        key = figure_key(fn, inputs, helpers)
+        outputs = [os.path.join(OUT, f'{name}.{fmt}') for fmt in FORMATS]
+        if not FORCE and manifest.get(name) == key and all(map(os.path.exists, outputs)):
+            print(f"· {name}.pdf unchanged")
+            continue
+        fn()
+        manifest[name] = key
+
+    with open(MANIFEST, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, indent=2)
     print(f"\nAll figures saved to {OUT}/")
     print("Upload the figures/ folder to Overleaf alongside executive_summary.tex")
@@ -11,6 +11,8 @@ from sklearn.cluster import KMeans
 import plotly.express as px
 import plotly.graph_objects as go
 
+from analysis.preprocessing import get_branch_category_totals, get_year_rows
+
 
 def build_branch_features(monthly_df, category_df, product_df):
     """
@@ -20,67 +22,70 @@ def build_branch_features(monthly_df, category_df, product_df):
     months = ['January', 'February', 'March', 'April', 'May', 'June',
               'July', 'August', 'September', 'October', 'November', 'December']
 
-    df_2025 = monthly_df[monthly_df['Year'] == 2025].copy()
-    df_2026 = monthly_df[monthly_df['Year'] == 2026].copy()
-
-    features = []
-    for _, row in df_2025.iterrows():
-        branch = row['Branch']
-
-        # Revenue
-        total_rev = row['Total_By_Year']
-        month_vals = [row[m] for m in months]
-        active_months = sum(1 for v in month_vals if v > 0)
-
-        # Seasonality: coefficient of variation across active months
-        active_vals = [v for v in month_vals if v > 0]
-        seasonality_cv = np.std(active_vals) / np.mean(active_vals) if len(active_vals) > 1 and np.mean(active_vals) > 0 else 0
-
-        # Summer vs winter ratio
-        summer = sum(row[m] for m in ['June', 'July', 'August'])
-        winter = sum(row[m] for m in ['December', 'January', 'February'])
-        summer_winter_ratio = summer / winter if winter > 0 else 0
-
-        # Growth (Jan 2026 vs Jan 2025)
-        j25 = row['January']
-        j26_row = df_2026[df_2026['Branch'] == branch]
-        j26 = j26_row['January'].values[0] if len(j26_row) > 0 else 0
-        growth = (j26 - j25) / j25 * 100 if j25 > 0 else (100 if j26 > 0 else 0)
-
-        # Category mix
-        cat = category_df[(category_df['Branch'] == branch) & (~category_df['IsAggregate'])]
-        bev_rev = cat[cat['Category'] == 'BEVERAGES']['TrueRevenue'].sum()
-        food_rev = cat[cat['Category'] == 'FOOD']['TrueRevenue'].sum()
-        bev_share = bev_rev / (bev_rev + food_rev) * 100 if (bev_rev + food_rev) > 0 else 50
-
-        # Margin
-        total_profit = cat['TotalProfit'].sum()
-        total_actual_rev = cat['TrueRevenue'].sum()
-        margin = total_profit / total_actual_rev * 100 if total_actual_rev > 0 else 0
-
-        # Volume (total qty)
-        total_qty = cat['Qty'].sum()
-
-        # Service type diversity
-        branch_products = product_df[product_df['Branch'] == branch]
-        service_types = branch_products['ServiceType'].nunique()
-
-        features.append({
-            'Branch': branch,
-            'Region': row['Region'],
-            'Total_Revenue': total_rev,
-            'Active_Months': active_months,
-            'Seasonality_CV': seasonality_cv,
-            'Summer_Winter_Ratio': summer_winter_ratio,
-            'Growth_Pct': growth,
-            'Beverage_Share_Pct': bev_share,
-            'Profit_Margin_Pct': margin,
-            'Total_Qty': total_qty,
-            'Service_Types': service_types,
-            'Revenue_Per_Month': total_rev / active_months if active_months > 0 else 0,
-        })
-
-    return pd.DataFrame(features)
+    df_2025 = get_year_rows(monthly_df, 2025)
+    df_2026 = get_year_rows(monthly_df, 2026)
+    branches = pd.Index(df_2025['Branch'].astype(object))
+
+    def per_branch(s):
+        """Align a Branch-indexed aggregate to the 2025 branch order."""
+        return s.set_axis(s.index.astype(object)).reindex(branches, fill_value=0).to_numpy()
+
+    # Revenue and seasonality, computed on the (branches x 12) month block
+    total_rev = df_2025['Total_By_Year'].to_numpy(dtype=float)
+    M = df_2025[months].to_numpy(dtype=float)
+    active = M > 0
+    active_months = active.sum(axis=1)
+    n_active = np.maximum(active_months, 1)
+
+    # Coefficient of variation across active months (0 with fewer than two)
+    mean = np.where(active, M, 0).sum(axis=1) / n_active
+    std = np.sqrt((np.where(active, M - mean[:, None], 0) ** 2).sum(axis=1) / n_active)
+    seasonality_cv = np.where((active_months > 1) & (mean > 0), std / np.where(mean > 0, mean, 1), 0)
+
+    # Summer (Jun-Aug) vs winter (Dec-Feb) ratio
+    summer = M[:, [5, 6, 7]].sum(axis=1)
+    winter = M[:, [11, 0, 1]].sum(axis=1)
+    summer_winter_ratio = np.divide(summer, winter, out=np.zeros_like(summer), where=winter > 0)
+
+    # Growth (Jan 2026 vs Jan 2025)
+    j25 = df_2025['January'].to_numpy(dtype=float)
+    jan_2026 = df_2026.drop_duplicates('Branch').set_index('Branch')['January']
+    j26 = per_branch(jan_2026).astype(float)
+    growth = np.where(j25 > 0, (j26 - j25) / np.where(j25 > 0, j25, 1) * 100,
+                      np.where(j26 > 0, 100, 0))
+
+    # Category mix, margin and volume from the non-aggregate category rows
+    by_category = get_branch_category_totals(category_df)
+    cat_rev = by_category['TrueRevenue']
+    cat_totals = pd.DataFrame({col: by_category[col].sum(axis=1) for col in ['TotalProfit', 'TrueRevenue', 'Qty']})
+    bev_rev = per_branch(cat_rev['BEVERAGES']) if 'BEVERAGES' in cat_rev else np.zeros(len(branches))
+    food_rev = per_branch(cat_rev['FOOD']) if 'FOOD' in cat_rev else np.zeros(len(branches))
+    bev_food = bev_rev + food_rev
+    bev_share = np.divide(bev_rev, bev_food, out=np.full(len(branches), 0.5), where=bev_food > 0) * 100
+
+    total_profit = per_branch(cat_totals['TotalProfit'])
+    total_actual_rev = per_branch(cat_totals['TrueRevenue'])
+    margin = np.divide(total_profit, total_actual_rev, out=np.zeros(len(branches)),
+                       where=total_actual_rev > 0) * 100
+
+    # Service type diversity
+    service_types = per_branch(product_df.groupby('Branch', observed=True)['ServiceType'].nunique())
+
+    return pd.DataFrame({
+        'Branch': branches.to_numpy(),
+        'Region': df_2025['Region'].astype(object).to_numpy(),
+        'Total_Revenue': total_rev,
+        'Active_Months': active_months,
+        'Seasonality_CV': seasonality_cv,
+        'Summer_Winter_Ratio': summer_winter_ratio,
+        'Growth_Pct': growth,
+        'Beverage_Share_Pct': bev_share,
+        'Profit_Margin_Pct': margin,
+        'Total_Qty': per_branch(cat_totals['Qty']).astype(float),
+        'Service_Types': service_types,
+        'Revenue_Per_Month': np.divide(total_rev, active_months, out=np.zeros_like(total_rev),
+                                       where=active_months > 0),
+    })
 
 
 def cluster_branches(features_df, n_clusters=4):
@@ -108,30 +113,18 @@ def cluster_branches(features_df, n_clusters=4):
     # Name clusters heuristically based on relative revenue and growth.
     # The logic mirrors a BCG-style framework: high-rev + growth = Flagship,
     # high-rev only = Cash Cow, growth only = Growth Engine, else Emerging.
-    cluster_names = {}
-    for c in range(n_clusters):
-        cluster_data = features_df[features_df['Cluster_ID'] == c]
-        avg_rev = cluster_data['Total_Revenue'].mean()
-        avg_growth = cluster_data['Growth_Pct'].mean()
-        avg_margin = cluster_data['Profit_Margin_Pct'].mean()
-
-        if avg_rev > features_df['Total_Revenue'].median() and avg_growth > 0:
-            cluster_names[c] = 'Flagship'
-        elif avg_rev > features_df['Total_Revenue'].median():
-            cluster_names[c] = 'Cash Cow'
-        elif avg_growth > features_df['Growth_Pct'].median():
-            cluster_names[c] = 'Growth Engine'
-        else:
-            cluster_names[c] = 'Emerging'
-
-    # Ensure unique names
-    name_counts = {}
-    for c, name in cluster_names.items():
-        if name in name_counts:
-            name_counts[name] += 1
-            cluster_names[c] = f"{name} {name_counts[name]}"
-        else:
-            name_counts[name] = 1
+    avgs = (features_df.groupby('Cluster_ID')[['Total_Revenue', 'Growth_Pct']].mean()
+            .reindex(range(n_clusters)))
+    high_rev = (avgs['Total_Revenue'] > features_df['Total_Revenue'].median()).to_numpy()
+    growing = (avgs['Growth_Pct'] > 0).to_numpy()
+    high_growth = (avgs['Growth_Pct'] > features_df['Growth_Pct'].median()).to_numpy()
+    names = pd.Series(np.select([high_rev & growing, high_rev, high_growth],
+                                ['Flagship', 'Cash Cow', 'Growth Engine'], default='Emerging'),
+                      index=avgs.index)
+
+    # Ensure unique names: repeats become "<name> 2", "<name> 3", ...
+    repeat = names.groupby(names).cumcount()
+    cluster_names = names.where(repeat == 0, names + ' ' + (repeat + 1).astype(str))
 
     features_df['Cluster'] = features_df['Cluster_ID'].map(cluster_names)
 
@@ -183,16 +176,12 @@ def cluster_radar(features_df):
 
     fig = go.Figure()
 
-    for cluster in features_df['Cluster'].unique():
-        cl_data = features_df[features_df['Cluster'] == cluster]
-        # Normalize each metric to 0-1 scale
-        values = []
-        for m in metrics:
-            col_min = features_df[m].min()
-            col_max = features_df[m].max()
-            col_range = col_max - col_min if col_max != col_min else 1
-            values.append((cl_data[m].mean() - col_min) / col_range)
+    # Cluster means, each metric min-max normalized to a 0-1 scale
+    col_min = features_df[metrics].min()
+    col_range = (features_df[metrics].max() - col_min).replace(0, 1)
+    norm = (features_df.groupby('Cluster', sort=False)[metrics].mean() - col_min) / col_range
 
+    for cluster, *values in norm.itertuples(name=None):
         fig.add_trace(go.Scatterpolar(
             r=values + [values[0]],  # Close the polygon
             theta=labels + [labels[0]],
@@ -215,15 +204,13 @@ def cluster_recommendations(features_df):
     """
     Generate strategic recommendations per cluster.
     """
-    recs = {}
-    for cluster in features_df['Cluster'].unique():
-        cl_data = features_df[features_df['Cluster'] == cluster]
-        branches = cl_data['Branch'].tolist()
-
-        avg_rev = cl_data['Total_Revenue'].mean()
-        avg_growth = cl_data['Growth_Pct'].mean()
-        avg_margin = cl_data['Profit_Margin_Pct'].mean()
+    grouped = features_df.groupby('Cluster', sort=False)
+    members = grouped['Branch'].agg(list)
+    avgs = grouped[['Total_Revenue', 'Growth_Pct', 'Profit_Margin_Pct']].mean()
 
+    recs = {}
+    for cluster, branches, avg_rev, avg_growth, avg_margin in zip(
+            avgs.index, members, avgs['Total_Revenue'], avgs['Growth_Pct'], avgs['Profit_Margin_Pct']):
         if 'Flagship' in cluster:
             strategy = "Protect and Optimize — These are your revenue powerhouses. Focus on margin improvement, modifier upsells, and operational efficiency. Don't change what works."
         elif 'Cash Cow' in cluster:
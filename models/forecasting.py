@@ -7,9 +7,35 @@ Supports Prophet, exponential smoothing, and XGBoost with time features.
 
 import pandas as pd
 import numpy as np
+import hashlib
+import inspect
+import os
+import tempfile
 import warnings
+import plotly.graph_objects as go
+from joblib import Parallel, delayed
+from sklearn.ensemble import GradientBoostingRegressor
 warnings.filterwarnings('ignore')
 
+from analysis.preprocessing import get_year_rows
+
+# On-disk forecast cache shared by the offline scripts (extract_data, generate_figures)
+FORECAST_CACHE_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'cache')
+
+# Bump when forecasts change for reasons the hashed model source can't see
+# (e.g. a scikit-learn upgrade); cached files from older versions are ignored
+FORECAST_CACHE_VERSION = 1
+
+# Model inputs for Feb-Dec 2026, identical for every branch:
+# [month_sin, month_cos, months_since_start, Month]
+FUTURE_MONTHS = np.arange(2, 13)
+FUTURE_FEATURES = np.column_stack([
+    np.sin(2 * np.pi * FUTURE_MONTHS / 12),
+    np.cos(2 * np.pi * FUTURE_MONTHS / 12),
+    (2026 - 2025) * 12 + FUTURE_MONTHS,
+    FUTURE_MONTHS,
+]).astype(float)
+
 
 def prepare_time_series(monthly_df, branch=None):
     """
@@ -18,29 +44,25 @@ def prepare_time_series(monthly_df, branch=None):
     """
     months = ['January', 'February', 'March', 'April', 'May', 'June',
               'July', 'August', 'September', 'October', 'November', 'December']
-    month_nums = {m: i+1 for i, m in enumerate(months)}
 
-    df = monthly_df.copy()
+    df = monthly_df
     if branch:
         df = df[df['Branch'] == branch]
 
-    records = []
-    for _, row in df.iterrows():
-        year = int(row['Year'])
-        for month_name in months:
-            val = row.get(month_name, 0)
-            if val > 0:  # Only include months with actual data
-                month_num = month_nums[month_name]
-                date = pd.Timestamp(year=year, month=month_num, day=1)
-                records.append({
-                    'ds': date,
-                    'y': val,
-                    'Branch': row['Branch'],
-                    'Year': year,
-                    'Month': month_num,
-                })
-
-    return pd.DataFrame(records)
+    # Row-major positions of the months with actual data, so each branch-year
+    # keeps its months in calendar order
+    values = df[months].to_numpy(dtype=float)
+    rows, cols = np.nonzero(values > 0)
+    years = df['Year'].to_numpy(dtype=np.int64)[rows]
+    month_nums = (cols + 1).astype(np.int64)
+
+    return pd.DataFrame({
+        'ds': ((years - 1970) * 12 + cols).astype('datetime64[M]').astype('datetime64[ns]'),
+        'y': values[rows, cols],
+        'Branch': df['Branch'].astype(object).to_numpy()[rows],
+        'Year': years,
+        'Month': month_nums,
+    })
 
 
 def forecast_branch_xgboost(monthly_df, branch, forecast_months=11):
@@ -48,8 +70,6 @@ def forecast_branch_xgboost(monthly_df, branch, forecast_months=11):
     Forecast using XGBoost with time features.
     Forecasts Feb-Dec 2026 (11 months).
     """
-    from sklearn.ensemble import GradientBoostingRegressor
-
     ts = prepare_time_series(monthly_df, branch)
     if len(ts) < 3:
         return None
@@ -73,19 +93,7 @@ def forecast_branch_xgboost(monthly_df, branch, forecast_months=11):
     )
     model.fit(X, y)
 
-    # Generate future dates (Feb-Dec 2026)
-    future_records = []
-    for month in range(2, 13):
-        future_records.append({
-            'Month': month,
-            'month_sin': np.sin(2 * np.pi * month / 12),
-            'month_cos': np.cos(2 * np.pi * month / 12),
-            'months_since_start': (2026 - 2025) * 12 + month,
-        })
-
-    future_df = pd.DataFrame(future_records)
-    X_future = future_df[features].values
-    predictions = model.predict(X_future)
+    predictions = model.predict(FUTURE_FEATURES)
 
     # Ensure non-negative
     predictions = np.maximum(predictions, 0)
@@ -108,21 +116,82 @@ def forecast_branch_xgboost(monthly_df, branch, forecast_months=11):
     return forecast_df
 
 
-def forecast_all_branches(monthly_df):
+def _try_forecast_branch(branch_df, branch):
+    """Forecast one branch, returning the error message instead of raising."""
+    try:
+        return forecast_branch_xgboost(branch_df, branch), None
+    except Exception as e:
+        return None, str(e)
+
+
+def forecast_fingerprint(monthly_df):
+    """
+    Short cache key for the forecasts of a monthly sales table.
+    Covers the data (index included) and the model: the cache version,
+    the source of the series prep and fitting code (hyperparameters
+    included) and the future feature matrix, so editing the model
+    invalidates previously cached forecasts.
+    """
+    h = hashlib.blake2b(pd.util.hash_pandas_object(monthly_df, index=True).to_numpy().tobytes())
+    h.update(str(FORECAST_CACHE_VERSION).encode())
+    for func in (prepare_time_series, forecast_branch_xgboost):
+        h.update(inspect.getsource(func).encode())
+    h.update(FUTURE_FEATURES.tobytes())
+    return h.hexdigest()[:16]
+
+
+def forecast_all_branches(monthly_df, n_jobs=1, cache_dir=None):
     """
     Forecast 2026 for all branches.
+    Branch fits are independent, but each takes only milliseconds, so by
+    default they run sequentially: for a chain of ~25 branches, starting a
+    process pool and pickling the slices costs more than it saves.  Pass
+    n_jobs=-1 to fan out across worker processes for much larger inputs.
+    If cache_dir is given, forecasts are stored there as fc_<hash>.parquet,
+    keyed by the monthly data and the model (see forecast_fingerprint),
+    and reused instead of refitting; an unreadable cache file is refit.
     Returns combined DataFrame with forecasts.
     """
-    all_forecasts = []
-    branches = monthly_df['Branch'].unique()
-
-    for branch in branches:
+    cache_path = None
+    if cache_dir is not None:
+        cache_path = os.path.join(cache_dir, f'fc_{forecast_fingerprint(monthly_df)}.parquet')
+        if os.path.exists(cache_path):
+            try:
+                return pd.read_parquet(cache_path)
+            except Exception as e:
+                print(f"  ⚠️ Ignoring unreadable forecast cache {cache_path}: {e}")
+
+    forecasts = _fit_all_branches(monthly_df, n_jobs)
+    if cache_path is not None and len(forecasts) > 0:
+        # Write to a temp file and rename it into place, so concurrent
+        # readers (backend threads) never see a half-written parquet
+        os.makedirs(cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+        os.close(fd)
         try:
-            fc = forecast_branch_xgboost(monthly_df, branch)
-            if fc is not None:
-                all_forecasts.append(fc)
-        except Exception as e:
-            print(f"  ⚠️ Could not forecast {branch}: {e}")
+            forecasts.to_parquet(tmp_path, index=False)
+            os.replace(tmp_path, cache_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+    return forecasts
+
+
+def _fit_all_branches(monthly_df, n_jobs):
+    """Fit every branch (sequentially unless n_jobs != 1) and concatenate the forecasts."""
+    # Split once; with n_jobs != 1 each worker is pickled only its own branch's rows
+    slices = dict(list(monthly_df.groupby('Branch', observed=True, sort=False)))
+    branches = list(slices)
+    results = Parallel(n_jobs=n_jobs)(
+        delayed(_try_forecast_branch)(slices[branch], branch) for branch in branches
+    )
+
+    all_forecasts = []
+    for branch, (fc, error) in zip(branches, results):
+        if error is not None:
+            print(f"  ⚠️ Could not forecast {branch}: {error}")
+        elif fc is not None:
+            all_forecasts.append(fc)
 
     if all_forecasts:
         return pd.concat(all_forecasts, ignore_index=True)
@@ -133,44 +202,40 @@ def compute_2026_projections(monthly_df, forecasts_df):
     """
     Combine actual Jan 2026 + forecast Feb-Dec 2026 for full year projection.
     """
-    df_2026 = monthly_df[monthly_df['Year'] == 2026].copy()
-
-    projections = []
-    for branch in df_2026['Branch'].unique():
-        jan_actual = df_2026[df_2026['Branch'] == branch]['January'].values[0]
-
-        branch_fc = forecasts_df[forecasts_df['Branch'] == branch]
-        if len(branch_fc) > 0:
-            forecast_sum = branch_fc['yhat'].sum()
-        else:
-            forecast_sum = 0
-
-        total_2026 = jan_actual + forecast_sum
-
-        # Get 2025 total for comparison
-        df_2025 = monthly_df[(monthly_df['Year'] == 2025) & (monthly_df['Branch'] == branch)]
-        total_2025 = df_2025['Total_By_Year'].values[0] if len(df_2025) > 0 else 0
-
-        yoy_growth = (total_2026 - total_2025) / total_2025 * 100 if total_2025 > 0 else 0
-
-        projections.append({
-            'Branch': branch,
-            'Jan_2026_Actual': jan_actual,
-            'Feb_Dec_Forecast': forecast_sum,
-            'Projected_2026_Total': total_2026,
-            'Actual_2025_Total': total_2025,
-            'YoY_Growth_Pct': yoy_growth,
-        })
-
-    return pd.DataFrame(projections)
+    # One row per branch (first occurrence), in order of appearance
+    df_2026 = get_year_rows(monthly_df, 2026).drop_duplicates('Branch')
+    df_2025 = get_year_rows(monthly_df, 2025).drop_duplicates('Branch')
+    branches = pd.Index(df_2026['Branch'].astype(object))
+
+    def per_branch(s):
+        return s.set_axis(s.index.astype(object)).reindex(branches, fill_value=0).to_numpy(dtype=float)
+
+    jan_actual = df_2026['January'].to_numpy(dtype=float)
+    if len(forecasts_df) > 0:
+        forecast_sum = per_branch(forecasts_df.groupby('Branch', sort=False)['yhat'].sum())
+    else:
+        forecast_sum = np.zeros(len(branches))
+    total_2026 = jan_actual + forecast_sum
+
+    # 2025 total for comparison
+    total_2025 = per_branch(df_2025.set_index('Branch')['Total_By_Year'])
+    yoy_growth = np.divide(total_2026 - total_2025, total_2025, out=np.zeros(len(branches)),
+                           where=total_2025 > 0) * 100
+
+    return pd.DataFrame({
+        'Branch': branches.to_numpy(),
+        'Jan_2026_Actual': jan_actual,
+        'Feb_Dec_Forecast': forecast_sum,
+        'Projected_2026_Total': total_2026,
+        'Actual_2025_Total': total_2025,
+        'YoY_Growth_Pct': yoy_growth,
+    })
 
 
 def forecast_chart(monthly_df, forecast_df, branch):
     """
     Create plotly chart showing historical data + forecast for a branch.
     """
-    import plotly.graph_objects as go
-
     # Historical data
     ts = prepare_time_series(monthly_df, branch)
 
@@ -199,10 +264,11 @@ def forecast_chart(monthly_df, forecast_df, branch):
                 marker=dict(size=6),
             ))
 
-            # Confidence interval
+            # Confidence interval: upper edge forward, lower edge back
+            ds = branch_fc['ds'].to_numpy()
             fig.add_trace(go.Scatter(
-                x=pd.concat([branch_fc['ds'], branch_fc['ds'][::-1]]),
-                y=pd.concat([branch_fc['yhat_upper'], branch_fc['yhat_lower'][::-1]]),
+                x=np.concatenate([ds, ds[::-1]]),
+                y=np.concatenate([branch_fc['yhat_upper'].to_numpy(), branch_fc['yhat_lower'].to_numpy()[::-1]]),
                 fill='toself',
                 fillcolor='rgba(52, 152, 219, 0.15)',
                 line=dict(color='rgba(255,255,255,0)'),
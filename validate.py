@@ -3,6 +3,9 @@ import sys
 sys.path.insert(0, '.')
 
 from data_cleaning import load_all_data
+from analysis.preprocessing import enable_copy_on_write
+
+enable_copy_on_write()
 data = load_all_data()
 print('Data loaded OK')
 